@@ -0,0 +1,88 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+
+class SemanticAnswerCache:
+    """LRU/TTL cache of answers keyed by index version and question embedding
+
+    A lookup hits when a stored question for the same index version has a
+    cosine similarity of at least `threshold` with the new question.
+    """
+
+    def __init__(self, max_entries=256, ttl_seconds=3600, threshold=0.95):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.threshold = threshold
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._next_key = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _normalize(vector):
+        # Imported on first use so creating the cache (at page load) stays cheap
+        import numpy as np
+        vector = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def _evict_expired(self, now):
+        expired = [key for key, entry in self._entries.items() if now - entry["created"] > self.ttl_seconds]
+        for key in expired:
+            del self._entries[key]
+
+    def lookup(self, index_version, vector):
+        """Return (answer, sources) for a near-duplicate question, or None"""
+        query = self._normalize(vector)
+        with self._lock:
+            self._evict_expired(time.monotonic())
+            best_key, best_score = None, self.threshold
+            for key, entry in self._entries.items():
+                if entry["index_version"] != index_version:
+                    continue
+                score = float(query.dot(entry["vector"]))
+                if score >= best_score:
+                    best_key, best_score = key, score
+            if best_key is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._entries.move_to_end(best_key)
+            entry = self._entries[best_key]
+            return entry["answer"], entry["sources"]
+
+    def store(self, index_version, question, vector, answer, sources):
+        """Remember an answer and the chunks it was generated from"""
+        with self._lock:
+            self._entries[self._next_key] = {
+                "index_version": index_version,
+                "question": question,
+                "vector": self._normalize(vector),
+                "answer": answer,
+                "sources": sources,
+                "created": time.monotonic(),
+            }
+            self._next_key += 1
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def stats(self):
+        """Return hit/miss counters and the current hit rate"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "entries": len(self._entries),
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+def answer_cache_from_env():
+    """Build a cache configured from ANSWER_CACHE_* environment variables"""
+    return SemanticAnswerCache(
+        max_entries=int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", "256")),
+        ttl_seconds=float(os.getenv("ANSWER_CACHE_TTL_SECONDS", "3600")),
+        threshold=float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.95")),
+    )
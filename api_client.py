@@ -0,0 +1,109 @@
+import json
+
+import requests
+
+class AssistantAPIError(RuntimeError):
+    """Raised when the serving API rejects or fails a request"""
+
+class AssistantClient:
+    """Thin HTTP client for the serving API in server.py
+
+    A single requests.Session keeps connections to the server alive across
+    Streamlit reruns.
+    """
+
+    def __init__(self, base_url, timeout=300):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        self.session = requests.Session()
+
+    def _request(self, method, path, **kwargs):
+        response = self.session.request(method, f"{self.base_url}{path}", timeout=self.timeout, **kwargs)
+        if response.status_code >= 400:
+            try:
+                message = response.json()["error"]
+            except (ValueError, KeyError):
+                message = response.text or response.reason
+            raise AssistantAPIError(f"{response.status_code}: {message}")
+        return response
+
+    def documents(self, namespace):
+        """Indexed documents and the embedding provider of a namespace's index"""
+        return self._request("GET", "/documents", params={"namespace": namespace}).json()
+
+    def stats(self):
+        """Server counters (answer cache hits and misses)"""
+        return self._request("GET", "/stats").json()
+
+    def metrics(self):
+        """Server stage metrics in the Prometheus text format"""
+        return self._request("GET", "/metrics").text
+
+    def ingest(self, uploads, namespace):
+        """Upload PDFs into a namespace and return the queued ingestion job"""
+        files = [
+            ("files", (getattr(upload, "name", None) or f"document-{i + 1}.pdf", upload, "application/pdf"))
+            for i, upload in enumerate(uploads)
+        ]
+        for upload in uploads:
+            upload.seek(0)
+        return self._request("POST", "/ingest", params={"namespace": namespace}, files=files).json()
+
+    def jobs(self, namespace):
+        """A namespace's ingestion jobs, newest first"""
+        return self._request("GET", "/jobs", params={"namespace": namespace}).json()
+
+    def job(self, job_id):
+        """An ingestion job's state and progress, or None if it is unknown"""
+        try:
+            return self._request("GET", f"/jobs/{job_id}").json()
+        except AssistantAPIError as e:
+            if str(e).startswith("404"):
+                return None
+            raise
+
+    def cancel_job(self, job_id):
+        """Cancel an ingestion job"""
+        return self._request("DELETE", f"/jobs/{job_id}").json()
+
+    def remove_document(self, digest, namespace):
+        """Remove one document from a namespace's index"""
+        return self._request("DELETE", f"/documents/{digest}", params={"namespace": namespace}).json()
+
+    def clear(self, namespace):
+        """Delete a namespace's whole index"""
+        return self._request("DELETE", "/documents", params={"namespace": namespace}).json()
+
+    def ask(self, question, namespace, stream=True, documents=None, on_sources=None, session_id=None):
+        """Yield the answer to a question about a namespace's documents, token by token when stream is True
+
+        documents restricts the search to those digests; on_sources is called
+        with the metadata of the chunks the answer drew on. With a session_id
+        the server rewrites follow-ups using that session's earlier questions.
+        """
+        body = {"question": question, "stream": stream}
+        if documents is not None:
+            body["documents"] = list(documents)
+        if session_id is not None:
+            body["session_id"] = session_id
+        response = self._request("POST", "/ask", params={"namespace": namespace}, json=body, stream=stream)
+        if not stream:
+            result = response.json()
+            if on_sources is not None:
+                on_sources(result.get("sources", []))
+            yield result["answer"]
+            return
+        if on_sources is not None:
+            on_sources(json.loads(response.headers.get("X-Sources", "[]")))
+        with response:
+            for text in response.iter_content(chunk_size=None, decode_unicode=True):
+                if text:
+                    yield text
+
+    def quiz(self, num_questions, difficulty, session_id, namespace):
+        """Generate a quiz from a namespace's documents; questions already served to session_id are not repeated"""
+        return self._request("POST", "/quiz", params={"namespace": namespace}, json={
+            "num_questions": num_questions,
+            "difficulty": difficulty,
+            "session_id": session_id,
+        }).json()
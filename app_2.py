@@ -11,7 +11,7 @@ st.set_page_config(
     layout="wide",
     initial_sidebar_state="expanded"
 )
-setup_environment()
+api_key = setup_environment()
 inject_custom_css()
 
 # Initialize session state
@@ -22,6 +22,12 @@ for key, default in {
     if key not in st.session_state:
         st.session_state[key] = default
 
+# A new session may open a corpus that earlier sessions already indexed
+if "index_stats_loaded" not in st.session_state:
+    from utils import update_index_stats
+    update_index_stats()
+    st.session_state.index_stats_loaded = True
+
 # Header
 st.markdown('<div class="main-header"><h1>📚 PDF AI Assistant & Quiz Generator</h1><p>Upload PDF documents, chat with them, and generate interactive quizzes</p></div>', unsafe_allow_html=True)
 
@@ -42,6 +48,19 @@ with st.sidebar:
     </div>
     """, unsafe_allow_html=True)
     
+    from utils import switch_namespace
+    from index_store import DEFAULT_NAMESPACE, NAMESPACE_PATTERN
+    
+    # Each corpus has its own index, so sessions on different corpora never overwrite each other
+    st.markdown("### 🗂️ Corpus")
+    namespace = st.text_input(
+        "Corpus", value=DEFAULT_NAMESPACE, key="namespace", on_change=switch_namespace,
+        help="Documents, questions and quizzes are scoped to this corpus",
+        label_visibility="collapsed"
+    )
+    if not NAMESPACE_PATTERN.match(namespace):
+        st.error("Use letters, digits, '-', '_' or '.' (up to 64 characters). Using the default corpus.")
+    
     # File uploader
     st.markdown("### 📁 Upload Documents")
     pdf_docs = st.file_uploader(
@@ -56,21 +75,39 @@ with st.sidebar:
         st.success(f"✅ {len(pdf_docs)} file(s) selected")
         for pdf in pdf_docs:
             st.write(f"📄 {pdf.name}")
-        
-        # Store PDF content for quiz generation
-        if len(pdf_docs) == 1:
-            st.session_state.pdf_content = pdf_docs[0].getbuffer()
     
-    from utils import process_documents, clear_data
+    from utils import process_documents, clear_data, get_index_summary, get_namespace, show_ingest_jobs
     
     # Process button
     if st.button("🚀 Process Documents"):
         process_documents(pdf_docs)
     
+    # Background ingestion progress (filled in at the end of the sidebar)
+    jobs_panel = st.container()
+    
+    # Indexed documents, each removable on its own
+    index_summary = get_index_summary(get_namespace())
+    indexed_documents = index_summary["documents"]
+    if indexed_documents:
+        st.markdown("### 📚 Indexed Documents")
+        st.caption(f"Embeddings: {index_summary['embedding_provider']}")
+        for digest, document in indexed_documents.items():
+            col1, col2 = st.columns([4, 1])
+            with col1:
+                st.write(f"📄 {document['name']} ({document['count']} chunks)")
+            with col2:
+                if st.button("✖", key=f"remove_{digest}", help="Remove this document from the index"):
+                    clear_data(digest)
+    
     # Clear button
     if st.button("🗑️ Clear All Data"):
         clear_data()
     
+    # Stage timings from the tracing spans, refreshed on every rerun
+    from utils import show_stats_panel
+    if st.checkbox("📈 Show live stats", key="show_stats"):
+        show_stats_panel()
+    
     # About section
     st.markdown("---")
     st.markdown("### ℹ️ About")
@@ -90,6 +127,13 @@ with st.sidebar:
     - Google Gemini AI
     - FAISS Vector Store
     """)
+    
+    # The page is drawn: load models and the corpus's index in the background
+    from utils import warm_up
+    warm_up(api_key, get_namespace())
+    
+    # Poll running ingestion jobs last so the rest of the page is already drawn
+    show_ingest_jobs(jobs_panel)
 
 if __name__ == "__main__":
     pass  # Main logic is handled in the imports and tab layout
\ No newline at end of file
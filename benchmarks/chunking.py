@@ -0,0 +1,126 @@
+"""Compare chunk sizes on retrieval hit rate, prompt tokens and answer latency.
+
+Each PDF is chunked at every size and embedded (by default with the local hashing
+provider). Every question is answered by top-k retrieval. A question counts as a
+hit when a retrieved chunk comes from its (file, page). Without --questions,
+one sentence is sampled from each page and used as the question, with that page
+as the ground truth. With --llm the retrieved context is also sent to Gemini,
+so answer latency is measured too.
+
+    python benchmarks/chunking.py manual.pdf guide.pdf --sizes 128 256 512 1024 --output chunking.json
+
+A questions file is a JSON list of {"question", "file", "page"} objects.
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import time
+
+import faiss
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from chunking import SENTENCE_PATTERN, chunk_pages, count_tokens
+from embedding import create_embeddings, embed_texts
+from utils import get_qa_prompt, iter_pdf_pages
+
+def load_pages(paths):
+    pages = {}
+    for file, page_no, text in iter_pdf_pages(paths):
+        pages.setdefault(file, []).append((page_no, text))
+    return pages
+
+def sample_questions(pages, limit, seed=0):
+    rng = random.Random(seed)
+    questions = []
+    for file, file_pages in pages.items():
+        for page_no, text in file_pages:
+            sentences = [s for s in SENTENCE_PATTERN.split(" ".join(text.split())) if len(s.split()) >= 8]
+            if sentences:
+                questions.append({"question": rng.choice(sentences), "file": file, "page": page_no})
+    rng.shuffle(questions)
+    return questions[:limit]
+
+def run_size(pages, questions, embeddings, max_tokens, k, model=None):
+    chunks = []
+    for file, file_pages in pages.items():
+        chunks += [dict(chunk, file=file) for chunk in chunk_pages(file_pages, max_tokens, max_tokens // 8)]
+    texts = [chunk["text"] for chunk in chunks]
+
+    started = time.perf_counter()
+    vectors = np.asarray(embed_texts(texts, embeddings), dtype=np.float32)
+    embed_seconds = time.perf_counter() - started
+    index = faiss.IndexFlatL2(vectors.shape[1])
+    index.add(vectors)
+
+    prompt = get_qa_prompt()
+    hits, prompt_tokens, retrieval_ms, answer_ms = 0, [], [], []
+    for question in questions:
+        started = time.perf_counter()
+        query = np.asarray([embeddings.embed_query(question["question"])], dtype=np.float32)
+        _, found = index.search(query, k)
+        retrieval_ms.append((time.perf_counter() - started) * 1000)
+        retrieved = [chunks[i] for i in found[0] if i >= 0]
+        hits += any(c["file"] == question["file"] and c["page"] == question["page"] for c in retrieved)
+        text = prompt.format(context="\n\n".join(c["text"] for c in retrieved), question=question["question"])
+        prompt_tokens.append(count_tokens(text))
+        if model is not None:
+            started = time.perf_counter()
+            model.invoke(text)
+            answer_ms.append((time.perf_counter() - started) * 1000)
+
+    result = {
+        "max_tokens": max_tokens,
+        "chunks": len(chunks),
+        "mean_chunk_tokens": round(statistics.mean(count_tokens(t) for t in texts), 1) if texts else 0,
+        "embed_seconds": round(embed_seconds, 3),
+        "hit_rate": round(hits / len(questions), 4) if questions else 0.0,
+        "mean_prompt_tokens": round(statistics.mean(prompt_tokens), 1) if prompt_tokens else 0,
+        "mean_retrieval_ms": round(statistics.mean(retrieval_ms), 3) if retrieval_ms else 0,
+    }
+    if answer_ms:
+        result["mean_answer_ms"] = round(statistics.mean(answer_ms), 1)
+        result["p95_answer_ms"] = round(float(np.percentile(answer_ms, 95)), 1)
+    return result
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("pdfs", nargs="+")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[128, 256, 512, 1024])
+    parser.add_argument("--k", type=int, default=3)
+    parser.add_argument("--provider", default="hashing")
+    parser.add_argument("--questions", help="JSON list of {question, file, page}")
+    parser.add_argument("--max-questions", type=int, default=200)
+    parser.add_argument("--llm", action="store_true", help="Also measure Gemini answer latency")
+    parser.add_argument("--output", help="Write the results as JSON to this path")
+    args = parser.parse_args()
+
+    api_key = os.getenv("GOOGLE_API_KEY")
+    pages = load_pages(args.pdfs)
+    if args.questions:
+        with open(args.questions, "r", encoding="utf-8") as f:
+            questions = json.load(f)[:args.max_questions]
+    else:
+        questions = sample_questions(pages, args.max_questions)
+    embeddings = create_embeddings(args.provider, api_key)
+    model = None
+    if args.llm:
+        from langchain_google_genai import ChatGoogleGenerativeAI
+        model = ChatGoogleGenerativeAI(model="models/gemini-1.5-flash", temperature=0.3, google_api_key=api_key)
+
+    results = [run_size(pages, questions, embeddings, size, args.k, model) for size in args.sizes]
+    columns = list(results[0])
+    print(f"{len(questions)} questions, top-{args.k}, {args.provider} embeddings")
+    print("".join(f"{column:>20}" for column in columns))
+    for result in results:
+        print("".join(f"{result[column]:>20}" for column in columns))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+if __name__ == "__main__":
+    main()
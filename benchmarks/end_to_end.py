@@ -0,0 +1,342 @@
+"""End-to-end ingest, question and quiz benchmark against fake Gemini models.
+
+The chat and embedding models are replaced by deterministic local fakes with
+configurable latency, and a synthetic PDF corpus is generated for every size,
+so runs need no API key and are comparable across commits. Each corpus is
+ingested into a fresh working directory, then questions (sentences sampled
+from the corpus) are answered through retrieval, context budgeting and the
+streaming answer path, and quizzes are generated by the sharded quiz path.
+
+    python benchmarks/end_to_end.py --pages 20 100 500 --chat-latency 0.2 --output e2e.json
+
+Sizes run smallest first; peak RSS is the process high-water mark so far.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import re
+import resource
+import statistics
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import quiz
+import quiz_bank
+import utils
+from chat import prepare_answer, record_answer
+from chunking import SENTENCE_PATTERN
+from embedding import FakeEmbeddingBackend
+
+QUIZ_REQUEST_PATTERN = re.compile(r"Generate (\d+) multiple-choice questions")
+CONTEXT_PATTERN = re.compile(r"Context:\s*(.*?)\s*Question:", re.DOTALL)
+
+WORDS = (
+    "valve pressure sensor calibration module firmware controller bearing torque voltage "
+    "circuit relay housing gasket coolant filter pump motor shaft coupling alignment "
+    "inspection schedule warranty operator manual safety procedure interval tolerance "
+    "lubricant thermal cycle reading display panel switch cable connector bracket mounting"
+).split()
+
+class FakeChatModel(BaseChatModel):
+    """Deterministic stand-in for the Gemini chat model
+
+    Quiz prompts get a JSON array of distinct, well-formed questions; any other
+    prompt is answered with the first answer_words words of its context. Each
+    call waits `latency` seconds before the first token and `token_latency`
+    seconds per streamed word.
+    """
+
+    latency: float = 0.0
+    token_latency: float = 0.0
+    answer_words: int = 60
+
+    @property
+    def _llm_type(self):
+        return "fake-gemini"
+
+    def _reply(self, prompt):
+        request = QUIZ_REQUEST_PATTERN.search(prompt)
+        if request:
+            rng = random.Random(prompt)
+            questions = []
+            for i in range(int(request.group(1))):
+                topic = " ".join(rng.sample(WORDS, 3))
+                questions.append({
+                    "question": f"Which statement about the {topic} ({rng.getrandbits(32):08x}) is correct?",
+                    "options": [f"The {topic} option {letter}" for letter in "ABCD"],
+                    "answer": rng.randrange(4),
+                })
+            return json.dumps(questions)
+        context = CONTEXT_PATTERN.search(prompt)
+        words = (context.group(1) if context else prompt).split()[:self.answer_words]
+        return " ".join(words) or "answer is not available in the context"
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        reply = self._reply(messages[-1].content)
+        time.sleep(self.latency + self.token_latency * len(reply.split()))
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=reply))])
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+        time.sleep(self.latency)
+        for i, word in enumerate(self._reply(messages[-1].content).split(" ")):
+            if self.token_latency:
+                time.sleep(self.token_latency)
+            yield ChatGenerationChunk(message=AIMessageChunk(content=word if i == 0 else f" {word}"))
+
+class FakeEmbeddings(Embeddings):
+    """FakeEmbeddingBackend vectors behind the LangChain interface, `latency` seconds per request"""
+
+    def __init__(self, dimensions=768, latency=0.0):
+        self._backend = FakeEmbeddingBackend(dimensions)
+        self.latency = latency
+
+    def embed_documents(self, texts):
+        if self.latency:
+            time.sleep(self.latency)
+        return self._backend.embed_documents(texts)
+
+    def embed_query(self, text):
+        if self.latency:
+            time.sleep(self.latency)
+        return self._backend.embed_query(text)
+
+@contextmanager
+def fake_backends(chat_model, embeddings):
+    """Route every model lookup in the app to the fakes
+
+    The quiz bank is disabled so quizzes always take the generation path
+    being measured and no background generation competes for the CPU.
+    """
+    patches = [
+        (utils, "_get_embeddings", lambda api_key, provider: embeddings),
+        (utils, "get_chat_model", lambda api_key: chat_model),
+        (quiz, "get_quiz_model", lambda api_key: chat_model),
+        (quiz, "create_quiz_model", lambda api_key: chat_model),
+        (quiz_bank, "schedule_bank_fill", lambda digest, api_key: None),
+        (quiz_bank, "take_questions", lambda *args, **kwargs: []),
+    ]
+    saved = [(module, name, getattr(module, name)) for module, name, _ in patches]
+    for module, name, replacement in patches:
+        setattr(module, name, replacement)
+    try:
+        yield
+    finally:
+        for module, name, original in saved:
+            setattr(module, name, original)
+
+def make_pdf(pages):
+    """Minimal PDF with one page per list of text lines (Helvetica, no compression)"""
+    objects = ["<< /Type /Catalog /Pages 2 0 R >>"]
+    kids = " ".join(f"{3 + 2 * i} 0 R" for i in range(len(pages)))
+    objects.append(f"<< /Type /Pages /Kids [{kids}] /Count {len(pages)} >>")
+    font = 3 + 2 * len(pages)
+    for i, lines in enumerate(pages):
+        objects.append(
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+            f"/Resources << /Font << /F1 {font} 0 R >> >> /Contents {4 + 2 * i} 0 R >>"
+        )
+        stream = "BT /F1 10 Tf 13 TL 54 740 Td " + " T* ".join(f"({line})Tj" for line in lines) + " ET"
+        objects.append(f"<< /Length {len(stream)} >>\nstream\n{stream}\nendstream")
+    objects.append("<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>")
+
+    out = "%PDF-1.4\n"
+    offsets = []
+    for i, body in enumerate(objects):
+        offsets.append(len(out))
+        out += f"{i + 1} 0 obj\n{body}\nendobj\n"
+    xref = len(out)
+    out += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n" + "".join(f"{offset:010d} 00000 n \n" for offset in offsets)
+    out += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n"
+    return out.encode("latin-1")
+
+def _page_lines(rng, section, lines_per_page=50, width=100):
+    lines = [f"{section}. {' '.join(rng.sample(WORDS, 2)).title()}"]
+    line = ""
+    while len(lines) < lines_per_page:
+        sentence = " ".join(rng.choice(WORDS) for _ in range(rng.randint(8, 18))).capitalize() + "."
+        for word in sentence.split():
+            if len(line) + len(word) + 1 > width:
+                lines.append(line)
+                line = ""
+            line = f"{line} {word}".strip()
+    return lines[:lines_per_page]
+
+def generate_corpus(directory, total_pages, pages_per_document, seed=0):
+    """Write total_pages of synthetic manual pages as PDFs of pages_per_document pages each"""
+    rng = random.Random(seed)
+    paths, page_texts = [], []
+    for start in range(0, total_pages, pages_per_document):
+        pages = [_page_lines(rng, start + i + 1) for i in range(min(pages_per_document, total_pages - start))]
+        path = os.path.join(directory, f"manual-{start // pages_per_document + 1:03d}.pdf")
+        with open(path, "wb") as f:
+            f.write(make_pdf(pages))
+        paths.append(path)
+        page_texts += [" ".join(lines) for lines in pages]
+    return paths, page_texts
+
+def sample_questions(page_texts, count, seed=0):
+    rng = random.Random(seed)
+    sentences = [s for text in page_texts for s in SENTENCE_PATTERN.split(text) if len(s.split()) >= 8]
+    return rng.sample(sentences, min(count, len(sentences)))
+
+def peak_rss_mb():
+    """Peak resident set size of this process and of its largest finished child, in MB"""
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    scale = 1024 * 1024 if platform.system() == "Darwin" else 1024
+    return (
+        round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / scale, 1),
+        round(resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / scale, 1),
+    )
+
+def percentiles(values_ms):
+    if not values_ms:
+        return {}
+    return {
+        "mean_ms": round(statistics.mean(values_ms), 2),
+        "p50_ms": round(float(np.percentile(values_ms, 50)), 2),
+        "p95_ms": round(float(np.percentile(values_ms, 95)), 2),
+        "p99_ms": round(float(np.percentile(values_ms, 99)), 2),
+    }
+
+def run_ingest(paths, pages, api_key):
+    """Spool and ingest the corpus, returning per-stage throughput"""
+    stage_started = {}
+
+    def on_progress(stage, done, total):
+        stage_started.setdefault(stage, time.perf_counter())
+
+    started = time.perf_counter()
+    uploads = []
+    try:
+        for path in paths:
+            uploads.append(open(path, "rb"))
+        files = utils.spool_uploads(uploads)
+    finally:
+        for upload in uploads:
+            upload.close()
+    result = utils.ingest_documents(files, api_key, on_progress=on_progress)
+    finished = time.perf_counter()
+
+    chunks = result["added_chunks"]
+    parse_seconds = stage_started["embedding"] - stage_started["parsing"]
+    embed_seconds = stage_started["indexing"] - stage_started["embedding"]
+    return {
+        "documents": len(files),
+        "pages": pages,
+        "chunks": chunks,
+        "ingest_seconds": round(finished - started, 3),
+        "parse_seconds": round(parse_seconds, 3),
+        "pages_per_second": round(pages / parse_seconds, 1) if parse_seconds > 0 else None,
+        "embed_seconds": round(embed_seconds, 3),
+        "chunks_per_second": round(chunks / embed_seconds, 1) if embed_seconds > 0 else None,
+        "index_build_seconds": round(finished - stage_started["indexing"], 3),
+    }
+
+def run_questions(questions, api_key):
+    """Answer every question once, returning latency percentiles and answer cache hits"""
+    latencies_ms, first_token_ms, cached = [], [], 0
+    for question in questions:
+        started = time.perf_counter()
+        prepared = prepare_answer(question, api_key)
+        if prepared["cached"] is not None:
+            cached += 1
+            answer = prepared["cached"][0]
+        else:
+            parts = []
+            for token in utils.stream_answer(prepared["context"], question, api_key):
+                if not parts:
+                    first_token_ms.append((time.perf_counter() - started) * 1000)
+                parts.append(token)
+            answer = "".join(parts)
+        record_answer(prepared, question, answer, started)
+        latencies_ms.append((time.perf_counter() - started) * 1000)
+    result = {"questions": len(questions), "cache_hits": cached, **percentiles(latencies_ms)}
+    if first_token_ms:
+        result["p50_first_token_ms"] = round(float(np.percentile(first_token_ms, 50)), 2)
+    return result
+
+def run_quizzes(count, num_questions, difficulty, api_key):
+    """Generate count quizzes through the sharded generation path"""
+    latencies_ms, produced = [], 0
+    for _ in range(count):
+        started = time.perf_counter()
+        questions, _, _ = quiz.build_quiz(num_questions, difficulty, api_key, set())
+        latencies_ms.append((time.perf_counter() - started) * 1000)
+        produced += len(questions)
+    return {"quizzes": count, "questions_per_quiz": num_questions, "questions_produced": produced, **percentiles(latencies_ms)}
+
+def run_size(total_pages, args):
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory(prefix="e2e-bench-") as workdir:
+        corpus_dir = os.path.join(workdir, "corpus")
+        os.makedirs(corpus_dir)
+        paths, page_texts = generate_corpus(corpus_dir, total_pages, args.pages_per_document)
+        # Indexes, caches and uploads are relative paths, so each size starts from scratch
+        os.chdir(workdir)
+        try:
+            result = {"total_pages": total_pages}
+            result["ingest"] = run_ingest(paths, len(page_texts), args.api_key)
+            result["ask"] = run_questions(sample_questions(page_texts, args.questions), args.api_key)
+            result["quiz"] = run_quizzes(args.quizzes, args.quiz_questions, args.difficulty, args.api_key)
+        finally:
+            os.chdir(cwd)
+    result["peak_rss_mb"], result["peak_child_rss_mb"] = peak_rss_mb()
+    return result
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--pages", type=int, nargs="+", default=[20, 100, 500], help="Corpus sizes in pages")
+    parser.add_argument("--pages-per-document", type=int, default=25)
+    parser.add_argument("--questions", type=int, default=100)
+    parser.add_argument("--quizzes", type=int, default=5)
+    parser.add_argument("--quiz-questions", type=int, default=10)
+    parser.add_argument("--difficulty", default="Medium")
+    parser.add_argument("--chat-latency", type=float, default=0.0, help="Seconds before the fake model's first token")
+    parser.add_argument("--token-latency", type=float, default=0.0, help="Seconds per streamed word")
+    parser.add_argument("--embed-latency", type=float, default=0.0, help="Seconds per fake embedding request")
+    parser.add_argument("--dimensions", type=int, default=768)
+    parser.add_argument("--output", help="Write the results as JSON to this path")
+    args = parser.parse_args()
+    # The fakes ignore the key, but the app threads one through every call
+    args.api_key = "fake"
+
+    chat_model = FakeChatModel(latency=args.chat_latency, token_latency=args.token_latency)
+    embeddings = FakeEmbeddings(args.dimensions, args.embed_latency)
+    with fake_backends(chat_model, embeddings):
+        results = [run_size(total_pages, args) for total_pages in sorted(args.pages)]
+
+    print(
+        f"{'pages':>8}{'chunks':>8}{'pages/s':>10}{'chunks/s':>10}{'index s':>9}"
+        f"{'ask p50':>9}{'ask p95':>9}{'ask p99':>9}{'quiz p50':>10}{'RSS MB':>8}"
+    )
+    for result in results:
+        ingest, ask = result["ingest"], result["ask"]
+        print(
+            f"{result['total_pages']:>8}{ingest['chunks']:>8}{ingest['pages_per_second'] or 0:>10.1f}"
+            f"{ingest['chunks_per_second'] or 0:>10.1f}{ingest['index_build_seconds']:>9.3f}"
+            f"{ask.get('p50_ms', 0):>9.1f}{ask.get('p95_ms', 0):>9.1f}{ask.get('p99_ms', 0):>9.1f}"
+            f"{result['quiz'].get('p50_ms', 0):>10.1f}{result['peak_rss_mb']:>8.1f}"
+        )
+    if args.output:
+        report = {
+            "config": {key: value for key, value in vars(args).items() if key not in ("api_key", "output")},
+            "python": platform.python_version(),
+            "results": results,
+        }
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""Import-time budget for the Streamlit entry point.
+
+Imports the modules app_2.py loads before its first paint in fresh
+interpreters with `python -X importtime`, then makes the calls the first
+render makes on a corpus with no index yet. Reports the time on top of
+Streamlit itself, and fails when it exceeds the budget or when a heavy
+dependency (LangChain, Gemini, FAISS, NumPy, PyPDF2) is loaded by the
+imports or by those calls:
+
+    python benchmarks/import_time.py --repeat 5 --budget-ms 150 --output import_time.json
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# What app_2.py imports at the top of the script
+ENTRY_MODULES = ("utils", "chat", "quiz", "style")
+
+# utils functions chat_interface() and the sidebar call before anything is indexed
+FIRST_RENDER_CALLS = ("get_index_summary", "get_answer_cache_stats")
+
+# Must only be loaded on the code paths that use them (or by utils.warm_up)
+HEAVY_MODULES = (
+    "numpy", "faiss", "PyPDF2", "langchain", "langchain_core", "langchain_community",
+    "langchain_google_genai", "google.generativeai",
+)
+
+# Milliseconds the entry modules may add on top of importing streamlit
+IMPORT_BUDGET_MS = 150
+
+def measure_once():
+    """Return ({top-level module: cumulative ms}, first render ms, heavy modules that were loaded) from a fresh interpreter"""
+    code = (
+        "import sys, json, time, streamlit\n"
+        f"import {', '.join(ENTRY_MODULES)}\n"
+        "started = time.perf_counter()\n"
+        + "".join(f"utils.{call}()\n" for call in FIRST_RENDER_CALLS)
+        + "render_ms = (time.perf_counter() - started) * 1000\n"
+        f"print(json.dumps([render_ms, [m for m in {list(HEAVY_MODULES)!r} if m in sys.modules]]))\n"
+    )
+    # An empty working directory is a corpus with no index, the default cold start
+    with tempfile.TemporaryDirectory() as workdir:
+        result = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", code],
+            cwd=workdir, capture_output=True, text=True, check=True,
+            env={**os.environ, "PYTHONPATH": os.pathsep.join(filter(None, [ROOT, os.getenv("PYTHONPATH")]))}
+        )
+    top_level = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.split("|", 2)
+        # Nested imports are indented under the module that triggered them
+        if cumulative.strip().isdigit() and not name[1:].startswith(" "):
+            top_level[name.strip()] = int(cumulative) / 1000
+    render_ms, loaded = json.loads(result.stdout.strip().splitlines()[-1])
+    return top_level, render_ms, loaded
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--budget-ms", type=float, default=IMPORT_BUDGET_MS)
+    parser.add_argument("--output", help="Write the report as JSON to this path")
+    args = parser.parse_args()
+
+    runs = [measure_once() for _ in range(args.repeat)]
+    # A module's cumulative time includes what it imports first, so modules
+    # shared with an earlier entry module count only once
+    streamlit_ms = statistics.median(top_level.get("streamlit", 0.0) for top_level, _, _ in runs)
+    modules_ms = {
+        name: statistics.median(top_level.get(name, 0.0) for top_level, _, _ in runs)
+        for name in ENTRY_MODULES
+    }
+    entry_ms = statistics.median(sum(top_level.get(name, 0.0) for name in ENTRY_MODULES) for top_level, _, _ in runs)
+    first_render_ms = statistics.median(render_ms for _, render_ms, _ in runs)
+    eager = sorted({module for _, _, loaded in runs for module in loaded})
+
+    report = {
+        "repeat": args.repeat,
+        "streamlit_ms": round(streamlit_ms, 1),
+        "entry_ms": round(entry_ms, 1),
+        "first_render_ms": round(first_render_ms, 1),
+        "total_ms": round(streamlit_ms + entry_ms + first_render_ms, 1),
+        "budget_ms": args.budget_ms,
+        "modules_ms": {name: round(ms, 1) for name, ms in modules_ms.items()},
+        "eager_heavy_modules": eager,
+    }
+    print(f"streamlit {report['streamlit_ms']:.1f} ms, entry modules and first render "
+          f"{report['entry_ms'] + report['first_render_ms']:.1f} ms (budget {args.budget_ms:.0f} ms), total {report['total_ms']:.1f} ms")
+    for name, ms in report["modules_ms"].items():
+        print(f"{ms:>10.1f} ms  {name}")
+    print(f"{report['first_render_ms']:>10.1f} ms  first render ({', '.join(FIRST_RENDER_CALLS)})")
+    if eager:
+        print(f"Heavy modules loaded before or during the first render: {', '.join(eager)}")
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    if eager or report["entry_ms"] + report["first_render_ms"] > args.budget_ms:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""Recall-vs-latency report for the FAISS index types against the exact index.
+
+Uses the cached embeddings of every document in a namespace's index as the
+corpus and a random sample of them as queries. Recall is also measured for
+searches filtered to a single document, as when a question is restricted to
+selected documents:
+
+    python benchmarks/index_recall.py --queries 200 --k 10 --output index_recall.json
+"""
+import argparse
+import json
+import os
+import random
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from embedding_providers import DEFAULT_EMBEDDING_PROVIDER
+from index_factory import recall_latency_report
+from index_store import DEFAULT_NAMESPACE, current_dir
+from ingest_cache import load_cached_document
+
+def load_corpus_vectors(namespace):
+    """Return (vectors, one array of vector ids per document)"""
+    index_dir = current_dir(namespace)
+    if index_dir is None:
+        return np.zeros((0, 0), dtype=np.float32), []
+    with open(os.path.join(index_dir, "manifest.json"), "r", encoding="utf-8") as f:
+        manifest = json.load(f)
+    provider = manifest.get("embedding_provider", DEFAULT_EMBEDDING_PROVIDER)
+    vectors, groups = [], []
+    for digest in manifest["documents"]:
+        entry = load_cached_document(digest, provider)
+        if entry is not None and entry["embeddings"]:
+            groups.append(np.arange(len(vectors), len(vectors) + len(entry["embeddings"])))
+            vectors += entry["embeddings"]
+    return np.asarray(vectors, dtype=np.float32), groups
+
+def default_configs():
+    configs = [{"type": "flat", "params": {}}]
+    configs += [{"type": "ivf_flat", "params": {"nprobe": nprobe}} for nprobe in (1, 4, 16, 64)]
+    configs += [{"type": "hnsw", "params": {"ef_search": ef}} for ef in (16, 64, 256)]
+    configs += [{"type": "ivf_pq", "params": {"nprobe": nprobe}} for nprobe in (4, 16, 64)]
+    return configs
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--namespace", default=DEFAULT_NAMESPACE)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--output", help="Write the report as JSON to this path")
+    args = parser.parse_args()
+
+    vectors, groups = load_corpus_vectors(args.namespace)
+    if len(vectors) == 0:
+        sys.exit("No cached embeddings found for the index; process some documents first.")
+    sample = random.Random(0).sample(range(len(vectors)), min(args.queries, len(vectors)))
+    # A filter is only meaningful when there is more than one document
+    groups = groups if len(groups) > 1 else None
+    report = recall_latency_report(vectors, vectors[sample], default_configs(), k=args.k, groups=groups)
+
+    print(f"{len(vectors)} vectors, {len(groups or [None])} documents, {len(sample)} queries")
+    print(
+        f"{'type':<10}{'params':<40}{'recall@' + str(args.k):>10}{'mean ms':>10}{'p95 ms':>10}{'MB':>8}"
+        f"{'filtered':>10}{'f. ms':>10}"
+    )
+    for row in report:
+        filtered = (
+            f"{row[f'filtered_recall@{args.k}']:>10.3f}{row['filtered_mean_ms']:>10.3f}" if groups else f"{'-':>10}{'-':>10}"
+        )
+        print(
+            f"{row['config']['type']:<10}{json.dumps(row['config']['params']):<40}"
+            f"{row[f'recall@{args.k}']:>10.3f}{row['mean_ms']:>10.3f}{row['p95_ms']:>10.3f}"
+            f"{row['size_bytes'] / 1e6:>8.1f}{filtered}"
+        )
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+if __name__ == "__main__":
+    main()
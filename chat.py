@@ -1,8 +1,13 @@
 import streamlit as st
+import logging
 import os
-from langchain_google_genai import GoogleGenerativeAIEmbeddings
-from langchain_community.vectorstores import FAISS
 import time
+import uuid
+
+import telemetry
+from index_store import DEFAULT_NAMESPACE
+
+logger = logging.getLogger(__name__)
 
 def chat_interface():
     """Interface for the PDF chatbot functionality"""
@@ -11,6 +16,25 @@ def chat_interface():
     # Chat input
     st.subheader("💬 Ask questions about your documents")
     
+    # Optionally search only some of the indexed documents
+    from utils import get_index_summary, get_namespace
+    indexed_documents = get_index_summary(get_namespace())["documents"]
+    selected_documents = []
+    if len(indexed_documents) > 1:
+        # Drop selections whose document was removed since the last rerun
+        if "chat_documents" in st.session_state:
+            st.session_state.chat_documents = [
+                digest for digest in st.session_state.chat_documents if digest in indexed_documents
+            ]
+        selected_documents = st.multiselect(
+            "Search in",
+            options=list(indexed_documents),
+            format_func=lambda digest: indexed_documents[digest]["name"],
+            key="chat_documents",
+            placeholder="All documents",
+            help="Restrict questions to these documents"
+        )
+    
     # Get user question
     user_question = st.text_input(
         "Enter your question:",
@@ -19,16 +43,18 @@ def chat_interface():
         label_visibility="collapsed"
     )
     
-    # Process the question
-    if user_question:
-        handle_user_question(user_question)
+    # Process the question once; the text input keeps its value across unrelated reruns
+    asked = (user_question, get_namespace(), tuple(selected_documents))
+    if user_question and st.session_state.get("last_question") != asked:
+        st.session_state.last_question = asked
+        handle_user_question(user_question, documents=selected_documents or None)
     
     # Chat history
     if st.session_state.chat_history:
         st.subheader("💭 Chat History")
         
         # Display messages in reverse chronological order
-        for i, (question, answer) in enumerate(reversed(st.session_state.chat_history)):
+        for i, (question, answer, citations) in enumerate(reversed(st.session_state.chat_history)):
             # Answer box
             st.markdown(f"""
             <div class="response-container">
@@ -36,6 +62,8 @@ def chat_interface():
                 <div class="response-text">{answer}</div>
             </div>
             """, unsafe_allow_html=True)
+            if citations:
+                st.caption(format_citations(citations))
             
             # Question box (smaller)
             st.markdown(f"""
@@ -45,7 +73,9 @@ def chat_interface():
             """, unsafe_allow_html=True)
     
     # Display stats
-    col1, col2 = st.columns(2)
+    from utils import get_answer_cache_stats
+    cache_stats = get_answer_cache_stats()
+    col1, col2, col3 = st.columns(3)
     with col1:
         st.markdown(f"""
         <div class="stats-card">
@@ -62,58 +92,204 @@ def chat_interface():
         </div>
         """, unsafe_allow_html=True)
     
+    with col3:
+        st.markdown(f"""
+        <div class="stats-card">
+            <div class="stats-number">{cache_stats['hit_rate']:.0%}</div>
+            <div class="stats-label">Answer Cache Hits ({cache_stats['hits']}/{cache_stats['hits'] + cache_stats['misses']})</div>
+        </div>
+        """, unsafe_allow_html=True)
+    
     st.markdown('</div>', unsafe_allow_html=True)
 
-def handle_user_question(user_question):
-    """Process user question and generate response"""
+def render_answer(container, answer):
+    """Render an answer into a Streamlit container"""
+    container.markdown(f"""
+    <div class="response-container">
+        <div class="response-label">🤖 AI Assistant:</div>
+        <div class="response-text">{answer}</div>
+    </div>
+    """, unsafe_allow_html=True)
+
+def cite(sources):
+    """Unique (file, page) citations, in order, from the metadata dicts of an answer's chunks"""
+    citations = []
+    for metadata in sources:
+        citation = (metadata.get("source"), metadata.get("page"))
+        if citation[0] and citation not in citations:
+            citations.append(citation)
+    return citations
+
+def format_citations(citations):
+    """Render citations as "📎 Sources: a.pdf p. 3, 7 · b.pdf p. 2" """
+    pages = {}
+    for file, page in citations:
+        pages.setdefault(file, [])
+        if page is not None:
+            pages[file].append(page)
+    return "📎 Sources: " + " · ".join(
+        f"{file} p. {', '.join(str(page) for page in sorted(file_pages))}" if file_pages else file
+        for file, file_pages in pages.items()
+    )
+
+def answer_with_chain(docs, user_question, api_key):
+    """Answer in one blocking call through the shared "stuff" chain"""
     from utils import get_conversational_chain
     
+    from chunking import count_tokens
+    
+    chain = get_conversational_chain(api_key)
+    with telemetry.span("ask.llm", streamed=False) as span:
+        response = chain(
+            {"input_documents": docs, "question": user_question},
+            return_only_outputs=True
+        )
+        span.set(answer_tokens=count_tokens(response["output_text"]))
+    return response["output_text"]
+
+def generate_answer(docs, user_question, api_key, container, stream=True):
+    """Generate an answer, streaming tokens into the container when the backend supports it"""
+    from utils import stream_answer
+    
+    if stream:
+        parts = []
+        render_seconds = 0.0
+        try:
+            for token in stream_answer(docs, user_question, api_key):
+                parts.append(token)
+                started = time.perf_counter()
+                render_answer(container, "".join(parts) + "▌")
+                render_seconds += time.perf_counter() - started
+        except Exception:
+            # Fall back to the blocking chain if nothing was streamed yet
+            if parts:
+                raise
+        else:
+            if parts:
+                answer = "".join(parts)
+                started = time.perf_counter()
+                render_answer(container, answer)
+                telemetry.record("ask.render", render_seconds + time.perf_counter() - started, updates=len(parts) + 1)
+                return answer
+    
+    # Non-streaming fallback through the shared conversational chain
+    with st.spinner("Thinking..."):
+        answer = answer_with_chain(docs, user_question, api_key)
+    with telemetry.span("ask.render", updates=1):
+        render_answer(container, answer)
+    return answer
+
+def prepare_answer(user_question, api_key, namespace=DEFAULT_NAMESPACE, documents=None):
+    """Look up a cached answer, or retrieve and compress the context for a new one from a namespace's index
+
+    documents, when given, restricts the search to those digests. Returns a
+    dict with the index version, the answer cache scope and the question
+    vector, the cached (answer, sources) or None, and on a miss the
+    retrieved "docs", the budgeted "context" and its "context_stats".
+    """
+    from context_budget import assemble_context, budget_from_env
+    from utils import get_answer_cache, get_embeddings, get_index_version, hybrid_search, load_vector_store
+    
+    # Shared vector store (reloaded only when the index files change)
+    with telemetry.span("ask.load_index"):
+        index_version = get_index_version(namespace)
+        vector_store = load_vector_store(api_key, namespace)
+    
+    # Embed the question once for both the answer cache and the search
+    with telemetry.span("ask.embed_query"):
+        question_vector = get_embeddings(api_key, namespace=namespace).embed_query(user_question)
+    
+    # Answer near-duplicate questions from the cache without calling the LLM
+    # Answers restricted to some documents are only reused for the same selection
+    cache_scope = index_version if documents is None else f"{index_version}|{','.join(sorted(documents))}"
+    with telemetry.span("ask.answer_cache") as span:
+        prepared = {
+            "index_version": index_version,
+            "cache_scope": cache_scope,
+            "question_vector": question_vector,
+            "cached": get_answer_cache().lookup(cache_scope, question_vector),
+        }
+        span.set(cache_hit=prepared["cached"] is not None)
+    if prepared["cached"] is None:
+        # Search each document for similar chunks (dense + BM25, fused into one top-k)
+        with telemetry.span("ask.search") as span:
+            docs = hybrid_search(vector_store, user_question, question_vector, namespace=namespace, documents=documents)
+            span.set(chunks=len(docs))
+        # Fit the retrieved chunks into the prompt's token budget
+        with telemetry.span("ask.context_budget") as span:
+            context, context_stats = assemble_context(user_question, docs, **budget_from_env())
+            span.set(chunks=len(context), tokens=context_stats["tokens_after"], tokens_saved=context_stats["tokens_saved"])
+        prepared.update(docs=docs, context=context, context_stats=context_stats)
+    return prepared
+
+def record_answer(prepared, user_question, answer, started):
+    """Cache a newly generated answer and log the question's latency and context savings"""
+    from utils import get_answer_cache
+    
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    if prepared["cached"] is not None:
+        logger.info("Answered from cache in %.0f ms", elapsed_ms)
+        return
+    # The budgeted context is what the answer was generated from, so it is what gets cited
+    get_answer_cache().store(prepared["cache_scope"], user_question, prepared["question_vector"], answer, prepared["context"])
+    stats = prepared["context_stats"]
+    logger.info(
+        "Answered in %.0f ms with %d context tokens (%d saved, %d chunks and %d sentences dropped)",
+        elapsed_ms, stats["tokens_after"], stats["tokens_saved"], stats["chunks_dropped"], stats["sentences_dropped"]
+    )
+
+def handle_user_question(user_question, stream=True, documents=None):
+    """Process user question and generate response, optionally searching only the given document digests"""
+    from utils import get_api_client, get_chat_model, get_conversation, get_index_version, get_namespace
+    
     # Check if documents have been processed
     if st.session_state.processed_files == 0:
         st.warning("Please process documents first before asking questions.")
         return
     
+    started = time.perf_counter()
     try:
-        with st.spinner("Thinking..."):
-            # Slight delay for better UX
-            time.sleep(0.5)
-            
-            # Get API key
-            api_key = os.getenv("GOOGLE_API_KEY")
-            
-            # Initialize embeddings
-            embeddings = GoogleGenerativeAIEmbeddings(
-                model="models/embedding-001",
-                google_api_key=api_key
-            )
-            
-            # Load the vector store
-            vector_store = FAISS.load_local("faiss_index", embeddings, allow_dangerous_deserialization=True)
-            
-            # Search for similar documents
-            docs = vector_store.similarity_search(user_question)
-            
-            # Get the conversational chain
-            chain = get_conversational_chain(api_key)
-            
-            # Generate response
-            response = chain(
-                {"input_documents": docs, "question": user_question},
-                return_only_outputs=True
-            )
-            
-            # Save to chat history
-            st.session_state.chat_history.append((user_question, response["output_text"]))
-            
-            # Display the response
-            st.markdown(f"""
-            <div class="response-container">
-                <div class="response-label">🤖 AI Assistant:</div>
-                <div class="response-text">{response["output_text"]}</div>
-            </div>
-            """, unsafe_allow_html=True)
+        with telemetry.trace("ask", namespace=get_namespace()) as trace:
+            client = get_api_client()
+            if client is not None:
+                # Answered by the serving API; render tokens as they arrive
+                container = st.empty()
+                parts = []
+                sources = []
+                # The server keeps the conversation memory of this session id
+                session_id = st.session_state.setdefault("session_id", uuid.uuid4().hex)
+                with st.spinner("Searching documents..."), telemetry.span("ask.remote"):
+                    for token in client.ask(user_question, get_namespace(), stream=stream, documents=documents,
+                                            on_sources=sources.extend, session_id=session_id):
+                        parts.append(token)
+                        render_answer(container, "".join(parts) + "▌")
+                answer = "".join(parts)
+                render_answer(container, answer)
+            else:
+                conversation = get_conversation()
+                with st.spinner("Searching documents..."):
+                    api_key = os.getenv("GOOGLE_API_KEY")
+                    # Follow-ups ("what about the second one?") are rewritten to stand on their own
+                    standalone_question = conversation.condense(user_question, get_chat_model(api_key))
+                    prepared = prepare_answer(standalone_question, api_key, get_namespace(), documents)
+                
+                trace.set(cache_hit=prepared["cached"] is not None)
+                if prepared["cached"] is not None:
+                    answer, source_docs = prepared["cached"]
+                    with telemetry.span("ask.render", updates=1):
+                        render_answer(st.empty(), answer)
+                else:
+                    # Generate and display the response
+                    source_docs = prepared["context"]
+                    answer = generate_answer(prepared["context"], standalone_question, api_key, st.empty(), stream=stream)
+                record_answer(prepared, standalone_question, answer, started)
+                conversation.add_turn(user_question, answer)
+                sources = [doc.metadata for doc in source_docs]
+        
+        # Save to chat history with the (file, page) of every chunk the answer drew on
+        st.session_state.chat_history.append((user_question, answer, cite(sources)))
             
     except Exception as e:
         st.error(f"Error processing your question: {str(e)}")
-        if "faiss_index" not in os.listdir():
-            st.warning("No documents have been processed. Please upload and process documents first.")
\ No newline at end of file
+        if get_api_client() is None and get_index_version(get_namespace()) is None:
+            st.warning("No documents have been processed. Please upload and process documents first.")
@@ -0,0 +1,121 @@
+import math
+import re
+
+# Bump when chunk boundaries change so cached chunks are rebuilt
+CHUNKER_VERSION = 3
+
+CHUNK_MAX_TOKENS = 512
+CHUNK_OVERLAP_TOKENS = 64
+
+TOKEN_PIECE_PATTERN = re.compile(r"\w+|[^\w\s]")
+SENTENCE_PATTERN = re.compile(r"(?<=[.!?])\s+(?=[A-Z0-9\"'(])")
+# "Chapter 3", "Section 2.1 Scope", "2.3 Installation", "4) Safety"
+HEADING_PATTERN = re.compile(r"^(?:(?:chapter|section|part|appendix)\s+[\w.]+|\d+(?:\.\d+)*[.)]?\s+[A-Z])", re.IGNORECASE)
+
+def count_tokens(text):
+    """Estimate the number of model tokens in text
+
+    Words count as one token per four characters (rounded up) and each
+    punctuation mark as one, which tracks SentencePiece tokenizers such as
+    Gemini's closely enough for budgeting without a network round trip.
+    """
+    return sum(max(1, math.ceil(len(piece) / 4)) for piece in TOKEN_PIECE_PATTERN.findall(text))
+
+def is_heading(line):
+    """Return True for short lines that look like a section heading"""
+    line = line.strip()
+    if not line or len(line.split()) > 10 or line.endswith((".", ",", ";", ":")):
+        return False
+    # Numbered / keyword headings, or short ALL CAPS lines
+    return bool(HEADING_PATTERN.match(line)) or (line.isupper() and len(line) >= 3)
+
+def _split_oversized(text, max_tokens):
+    """Split a block that is too large on sentence boundaries, then on words"""
+    pieces = []
+    for sentence in SENTENCE_PATTERN.split(text):
+        if count_tokens(sentence) <= max_tokens:
+            pieces.append(sentence)
+            continue
+        words, current = sentence.split(), []
+        for word in words:
+            if current and count_tokens(" ".join(current + [word])) > max_tokens:
+                pieces.append(" ".join(current))
+                current = []
+            current.append(word)
+        if current:
+            pieces.append(" ".join(current))
+    return pieces
+
+def _page_blocks(text):
+    """Yield (is_heading, text) blocks for a page in reading order"""
+    paragraph = []
+    for line in text.splitlines():
+        if is_heading(line):
+            if paragraph:
+                yield False, " ".join(paragraph)
+                paragraph = []
+            yield True, line.strip()
+        elif line.strip():
+            paragraph.append(line.strip())
+        elif paragraph:
+            yield False, " ".join(paragraph)
+            paragraph = []
+    if paragraph:
+        yield False, " ".join(paragraph)
+
+def _overlap_tail(parts, overlap_tokens):
+    """Trailing parts of a chunk that fit in the overlap budget"""
+    tail = []
+    for part in reversed(parts):
+        if count_tokens(" ".join([part] + tail)) > overlap_tokens:
+            break
+        tail.insert(0, part)
+    return tail
+
+def chunk_pages(pages, max_tokens=CHUNK_MAX_TOKENS, overlap_tokens=CHUNK_OVERLAP_TOKENS):
+    """Split [(page_no, text)] into chunks that stay within one page and one section
+
+    Returns a list of {"text", "page"} dicts. A heading always starts a new
+    chunk and is repeated at the start of every chunk in its section, so the
+    chunk carries its context. Consecutive chunks of a section overlap by up
+    to overlap_tokens.
+    """
+    chunks = []
+    for page_no, text in pages:
+        heading = None
+        parts, tokens = [], 0
+
+        def flush():
+            nonlocal parts, tokens
+            body = [part for part in parts if part != heading]
+            if body:
+                chunks.append({"text": "\n".join(parts), "page": page_no})
+                parts = ([heading] if heading else []) + _overlap_tail(body, overlap_tokens)
+            else:
+                parts = [heading] if heading else []
+            tokens = count_tokens(" ".join(parts))
+
+        for block_is_heading, block in _page_blocks(text):
+            if block_is_heading:
+                flush()
+                heading = block
+                parts, tokens = [heading], count_tokens(heading)
+                continue
+            # Pieces share their chunk with the repeated heading
+            budget = max(1, max_tokens - (count_tokens(heading) if heading else 0))
+            for piece in _split_oversized(block, budget) if count_tokens(block) > budget else [block]:
+                piece_tokens = count_tokens(piece)
+                if tokens + piece_tokens > max_tokens:
+                    flush()
+                    # The overlap itself must not push the piece over budget; the heading stays
+                    kept = 1 if heading else 0
+                    while len(parts) > kept and tokens + piece_tokens > max_tokens:
+                        parts.pop(kept)
+                        tokens = count_tokens(" ".join(parts))
+                parts.append(piece)
+                tokens += piece_tokens
+        # Pages never share a chunk
+        body = [part for part in parts if part != heading]
+        if body:
+            chunks.append({"text": "\n".join(parts), "page": page_no})
+    return chunks
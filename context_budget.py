@@ -0,0 +1,99 @@
+import os
+
+import numpy as np
+from langchain_core.documents import Document
+
+from chunking import SENTENCE_PATTERN, count_tokens, is_heading
+from embedding import HashingEmbeddings
+
+CONTEXT_MAX_TOKENS = 1500
+# Cosine similarity (hashed lexical vectors) below which a sentence is dropped
+CONTEXT_MIN_SIMILARITY = 0.08
+
+# Sentence scoring stays local whatever provider built the index
+_scorer = HashingEmbeddings()
+
+def budget_from_env():
+    """Read the context budget from CONTEXT_* environment variables"""
+    return {
+        "max_tokens": int(os.getenv("CONTEXT_MAX_TOKENS", str(CONTEXT_MAX_TOKENS))),
+        "min_similarity": float(os.getenv("CONTEXT_MIN_SIMILARITY", str(CONTEXT_MIN_SIMILARITY))),
+    }
+
+def _sentences(text):
+    """Split a chunk into its heading (if any) and sentences"""
+    heading, sentences = None, []
+    for line in text.splitlines():
+        line = line.strip()
+        if not line:
+            continue
+        if heading is None and not sentences and is_heading(line):
+            heading = line
+            continue
+        sentences += [sentence.strip() for sentence in SENTENCE_PATTERN.split(line) if sentence.strip()]
+    return heading, sentences
+
+def assemble_context(question, docs, max_tokens=CONTEXT_MAX_TOKENS, min_similarity=CONTEXT_MIN_SIMILARITY):
+    """Compress retrieved chunks into a context that fits max_tokens
+
+    Sentences repeated across chunks (chunk overlap, repeated boilerplate) are
+    kept once, sentences with low similarity to the question are dropped, and
+    the best remaining sentences are packed into the budget. Each chunk keeps
+    its heading and sentence order; chunks are ordered by their best sentence.
+
+    Returns (docs, stats) where docs are new Documents with the original
+    metadata and stats has the token counts before and after.
+    """
+    tokens_before = sum(count_tokens(doc.page_content) for doc in docs)
+
+    # (doc position, sentence position, text) for each sentence seen first in that doc
+    headings, candidates, seen = [], [], set()
+    for doc_position, doc in enumerate(docs):
+        heading, sentences = _sentences(doc.page_content)
+        headings.append(heading)
+        for position, sentence in enumerate(sentences):
+            key = " ".join(sentence.lower().split())
+            if key in seen:
+                continue
+            seen.add(key)
+            candidates.append((doc_position, position, sentence))
+
+    if candidates:
+        vectors = np.asarray(_scorer.embed_documents([sentence for _, _, sentence in candidates]))
+        scores = vectors @ np.asarray(_scorer.embed_query(question))
+    else:
+        scores = np.zeros(0)
+    relevant = [i for i in range(len(candidates)) if scores[i] >= min_similarity]
+    # Nothing matches lexically (e.g. a paraphrased question): rank everything instead
+    if not relevant:
+        relevant = list(range(len(candidates)))
+
+    # Greedily pack the most similar sentences, ties broken by retrieval rank
+    selected, tokens = {}, 0
+    for i in sorted(relevant, key=lambda i: (-scores[i], candidates[i][0], candidates[i][1])):
+        doc_position, position, sentence = candidates[i]
+        cost = count_tokens(sentence)
+        if doc_position not in selected and headings[doc_position]:
+            cost += count_tokens(headings[doc_position])
+        if tokens + cost > max_tokens:
+            continue
+        selected.setdefault(doc_position, []).append((position, sentence, float(scores[i])))
+        tokens += cost
+
+    ranked = sorted(selected.items(), key=lambda item: (-max(score for _, _, score in item[1]), item[0]))
+    compressed = []
+    for doc_position, sentences in ranked:
+        body = " ".join(sentence for _, sentence, _ in sorted(sentences))
+        heading = headings[doc_position]
+        text = f"{heading}\n{body}" if heading else body
+        compressed.append(Document(page_content=text, metadata=dict(docs[doc_position].metadata)))
+
+    tokens_after = sum(count_tokens(doc.page_content) for doc in compressed)
+    return compressed, {
+        "tokens_before": tokens_before,
+        "tokens_after": tokens_after,
+        "tokens_saved": tokens_before - tokens_after,
+        "chunks_dropped": len(docs) - len(compressed),
+        "sentences_dropped": sum(len(_sentences(doc.page_content)[1]) for doc in docs)
+        - sum(len(sentences) for sentences in selected.values()),
+    }
@@ -0,0 +1,149 @@
+import os
+import threading
+from collections import OrderedDict
+
+import telemetry
+from chunking import count_tokens
+
+# Turns resent verbatim to the question rewrite; older ones live in the summary
+CHAT_RECENT_TURNS = 3
+# Token budget of the recent turns in the rewrite prompt (answers are trimmed to fit)
+CHAT_HISTORY_MAX_TOKENS = 800
+# Token budget of the running summary of older turns
+CHAT_SUMMARY_MAX_TOKENS = 300
+# Rewritten questions remembered per session
+CHAT_REWRITE_CACHE_SIZE = 64
+
+CONDENSE_PROMPT = """Given the summary of an earlier conversation about some documents, its most recent turns and a follow-up question,
+rewrite the follow-up as a single standalone question that can be understood without the conversation. Resolve references such as
+"it", "that one" or "the second one" to what they refer to. If the question is already standalone, return it unchanged.
+Reply with the question only.
+
+Summary of earlier conversation:
+{summary}
+
+Recent turns:
+{history}
+
+Follow-up question: {question}
+Standalone question:"""
+
+SUMMARY_PROMPT = """Extend the summary of a conversation about some documents with the new turns below. Keep the topics,
+entities, numbers and answers a later follow-up question could refer to, drop pleasantries, and write at most {words} words.
+
+Current summary:
+{summary}
+
+New turns:
+{turns}
+
+Updated summary:"""
+
+def conversation_from_env():
+    """Read the conversation memory limits from CHAT_* environment variables"""
+    return {
+        "recent_turns": int(os.getenv("CHAT_RECENT_TURNS", str(CHAT_RECENT_TURNS))),
+        "history_max_tokens": int(os.getenv("CHAT_HISTORY_MAX_TOKENS", str(CHAT_HISTORY_MAX_TOKENS))),
+        "summary_max_tokens": int(os.getenv("CHAT_SUMMARY_MAX_TOKENS", str(CHAT_SUMMARY_MAX_TOKENS))),
+    }
+
+def truncate_tokens(text, max_tokens):
+    """Cut text after the last whole word that fits max_tokens"""
+    if count_tokens(text) <= max_tokens:
+        return text
+    words, tokens = [], 0
+    for word in text.split():
+        tokens += count_tokens(word)
+        if tokens > max_tokens:
+            break
+        words.append(word)
+    return " ".join(words) + " …"
+
+def _format_turns(turns):
+    return "\n".join(f"User: {question}\nAssistant: {answer}" for question, answer in turns)
+
+class Conversation:
+    """Bounded chat memory of one session, used to rewrite follow-ups into standalone questions
+
+    The last recent_turns turns are kept verbatim; older turns are folded into
+    a running summary one batch at a time, so no turn is ever summarised
+    twice. Rewrites are cached by question and turn count, so a retried
+    follow-up costs no LLM call, and the rewrite prompt never grows past
+    summary_max_tokens + history_max_tokens plus the question.
+    """
+
+    def __init__(self, recent_turns=CHAT_RECENT_TURNS, history_max_tokens=CHAT_HISTORY_MAX_TOKENS,
+                 summary_max_tokens=CHAT_SUMMARY_MAX_TOKENS):
+        self.recent_turns = max(1, recent_turns)
+        self.history_max_tokens = history_max_tokens
+        self.summary_max_tokens = summary_max_tokens
+        self.summary = ""
+        self.turns = []
+        self.summarized_turns = 0
+        self._rewrites = OrderedDict()
+        # Requests of one session may overlap on the serving API
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return self.summarized_turns + len(self.turns)
+
+    def add_turn(self, question, answer):
+        """Remember an answered question (the user's wording, not the rewrite)"""
+        with self._lock:
+            self.turns.append((question, answer))
+
+    def _summarize(self, model):
+        """Fold the turns that left the recent window into the summary with one LLM call"""
+        overflow = self.turns[:-self.recent_turns]
+        if not overflow:
+            return
+        with telemetry.span("ask.summarize", turns=len(overflow)) as span:
+            prompt = SUMMARY_PROMPT.format(
+                summary=self.summary or "(none)",
+                turns=_format_turns(overflow),
+                # Words run about 1.3 tokens each
+                words=max(20, self.summary_max_tokens * 3 // 4),
+            )
+            summary = model.invoke(prompt).content.strip()
+            self.summary = truncate_tokens(summary, self.summary_max_tokens)
+            span.set(prompt_tokens=count_tokens(prompt), summary_tokens=count_tokens(self.summary))
+        self.turns = self.turns[len(overflow):]
+        self.summarized_turns += len(overflow)
+
+    def _history(self):
+        """Recent turns, newest kept first, with each answer trimmed to its share of the budget"""
+        answer_tokens = max(20, self.history_max_tokens // self.recent_turns)
+        lines, tokens = [], 0
+        for question, answer in reversed(self.turns):
+            turn = _format_turns([(question, truncate_tokens(answer, answer_tokens))])
+            cost = count_tokens(turn)
+            if lines and tokens + cost > self.history_max_tokens:
+                break
+            lines.insert(0, turn)
+            tokens += cost
+        return "\n".join(lines)
+
+    def condense(self, question, model):
+        """Return question rewritten to stand on its own given the conversation so far
+
+        The first question of a conversation is returned as is, without an
+        LLM call; the model's reply falls back to the question when empty.
+        """
+        with self._lock:
+            if not self.turns and not self.summary:
+                return question
+            key = (" ".join(question.lower().split()), len(self))
+            standalone = self._rewrites.get(key)
+            if standalone is not None:
+                self._rewrites.move_to_end(key)
+                telemetry.record("ask.condense", 0.0, cache_hit=True)
+                return standalone
+            self._summarize(model)
+            with telemetry.span("ask.condense", cache_hit=False) as span:
+                prompt = CONDENSE_PROMPT.format(summary=self.summary or "(none)", history=self._history() or "(none)", question=question)
+                standalone = model.invoke(prompt).content.strip() or question
+                span.set(prompt_tokens=count_tokens(prompt))
+            self._rewrites[key] = standalone
+            while len(self._rewrites) > CHAT_REWRITE_CACHE_SIZE:
+                self._rewrites.popitem(last=False)
+            return standalone
@@ -0,0 +1,229 @@
+import asyncio
+import hashlib
+import json
+import math
+import os
+import random
+import re
+import shutil
+import threading
+import time
+from collections import Counter
+from functools import lru_cache
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from embedding_providers import DEFAULT_EMBEDDING_PROVIDER, EMBEDDING_PROVIDERS
+
+CHECKPOINT_DIR = "embedding_checkpoints"
+
+# Gemini accepts at most 100 texts per batch embedding request
+EMBED_BATCH_SIZE = 100
+EMBED_CONCURRENCY = 4
+EMBED_MAX_RETRIES = 6
+EMBED_BASE_DELAY = 1.0
+
+
+class RateLimitError(Exception):
+    """Raised by embedding backends when the provider returns HTTP 429"""
+
+def is_rate_limit_error(error):
+    """Return True if an embedding call failed because of a quota / rate limit"""
+    if isinstance(error, RateLimitError):
+        return True
+    if getattr(error, "code", None) == 429 or getattr(error, "status_code", None) == 429:
+        return True
+    message = str(error)
+    return "429" in message or "ResourceExhausted" in type(error).__name__ or "quota" in message.lower()
+
+class FakeEmbeddingBackend:
+    """Deterministic local embedding backend for tests and offline runs
+
+    Vectors are derived from a hash of each text. Every `fail_every`-th call
+    raises RateLimitError and each call sleeps for `latency` seconds, so the
+    pipeline's batching, concurrency and backoff can be exercised offline.
+    """
+
+    def __init__(self, dimensions=768, latency=0.0, fail_every=0):
+        self.dimensions = dimensions
+        self.latency = latency
+        self.fail_every = fail_every
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def embed_documents(self, texts):
+        with self._lock:
+            self.calls += 1
+            call = self.calls
+        if self.latency:
+            time.sleep(self.latency)
+        if self.fail_every and call % self.fail_every == 0:
+            raise RateLimitError("429 Resource has been exhausted (fake backend)")
+        return [self.embed_query(text) for text in texts]
+
+    def embed_query(self, text):
+        seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "big")
+        rng = random.Random(seed)
+        return [rng.uniform(-1.0, 1.0) for _ in range(self.dimensions)]
+
+TOKEN_PATTERN = re.compile(r"\w+")
+
+@lru_cache(maxsize=1 << 16)
+def _hashed_feature(token):
+    return int.from_bytes(hashlib.blake2b(token.encode("utf-8"), digest_size=8).digest(), "little")
+
+class HashingEmbeddings(Embeddings):
+    """Local CPU embeddings from hashed word and word-bigram counts
+
+    Each text is projected into `dimensions` signed buckets with sublinear
+    term-frequency weights and L2-normalised, so cosine similarity behaves
+    like TF-weighted lexical overlap. No network, model download or fitting
+    step is needed, and vectors are identical across processes.
+    """
+
+    def __init__(self, dimensions=768, batch_size=256):
+        self.dimensions = dimensions
+        self.batch_size = batch_size
+
+    def _embed_batch(self, texts):
+        rows, cols, weights = [], [], []
+        for row, text in enumerate(texts):
+            tokens = TOKEN_PATTERN.findall(text.lower())
+            counts = Counter(tokens)
+            counts.update(f"{a} {b}" for a, b in zip(tokens, tokens[1:]))
+            for token, count in counts.items():
+                feature = _hashed_feature(token)
+                rows.append(row)
+                cols.append(feature % self.dimensions)
+                weights.append((1.0 + math.log(count)) * (1.0 if feature >> 63 else -1.0))
+        matrix = np.zeros((len(texts), self.dimensions), dtype=np.float32)
+        np.add.at(matrix, (rows, cols), weights)
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return matrix / norms
+
+    def embed_documents(self, texts):
+        vectors = [self._embed_batch(texts[i:i + self.batch_size]) for i in range(0, len(texts), self.batch_size)]
+        if not vectors:
+            return []
+        return np.vstack(vectors).tolist()
+
+    def embed_query(self, text):
+        return self._embed_batch([text])[0].tolist()
+
+def create_embeddings(provider, api_key=None):
+    """Create the embeddings client for a provider name in EMBEDDING_PROVIDERS"""
+    if provider == "google":
+        from langchain_google_genai import GoogleGenerativeAIEmbeddings
+        return GoogleGenerativeAIEmbeddings(
+            model="models/embedding-001",
+            google_api_key=api_key
+        )
+    if provider == "hashing":
+        return HashingEmbeddings()
+    if provider == "sentence-transformers":
+        try:
+            from langchain_community.embeddings import HuggingFaceEmbeddings
+            return HuggingFaceEmbeddings(model_name="sentence-transformers/all-MiniLM-L6-v2")
+        except ImportError as e:
+            raise ImportError("The sentence-transformers provider needs `pip install sentence-transformers`.") from e
+    raise ValueError(f"Unknown embedding provider: {provider}")
+
+class _RateLimitScheduler:
+    """Shared backoff state so one 429 pauses every in-flight worker"""
+
+    def __init__(self, base_delay):
+        self.base_delay = base_delay
+        self.resume_at = 0.0
+
+    async def wait(self):
+        delay = self.resume_at - time.monotonic()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    def back_off(self, attempt):
+        delay = self.base_delay * (2 ** attempt) + random.uniform(0, self.base_delay)
+        self.resume_at = max(self.resume_at, time.monotonic() + delay)
+
+def _batch_hash(batch):
+    digest = hashlib.sha256()
+    for text in batch:
+        digest.update(text.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+def _load_checkpoint(path, batch):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            checkpoint = json.load(f)
+    except (OSError, ValueError):
+        return None
+    # Only reuse vectors computed for exactly the same texts
+    if checkpoint.get("hash") != _batch_hash(batch):
+        return None
+    return checkpoint["vectors"]
+
+def _save_checkpoint(path, batch, vectors):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump({"hash": _batch_hash(batch), "vectors": [list(map(float, v)) for v in vectors]}, f)
+    os.replace(tmp_path, path)
+
+async def embed_texts_async(texts, backend, batch_size=EMBED_BATCH_SIZE, max_concurrency=EMBED_CONCURRENCY,
+                            max_retries=EMBED_MAX_RETRIES, base_delay=EMBED_BASE_DELAY,
+                            checkpoint_key=None, on_progress=None):
+    """Embed texts in batches with bounded concurrency, 429 backoff and resumable checkpoints
+
+    `backend` is anything with an `embed_documents(texts)` method (a LangChain
+    embeddings client or FakeEmbeddingBackend). When `checkpoint_key` is given,
+    finished batches are written under CHECKPOINT_DIR so a failed run resumes
+    where it stopped. on_progress(texts_done, total_texts) is called per batch.
+    """
+    batches = [texts[i:i + batch_size] for i in range(0, len(texts), batch_size)]
+    results = [None] * len(batches)
+
+    checkpoint_dir = None
+    if checkpoint_key:
+        checkpoint_dir = os.path.join(CHECKPOINT_DIR, checkpoint_key)
+        os.makedirs(checkpoint_dir, exist_ok=True)
+        for i, batch in enumerate(batches):
+            results[i] = _load_checkpoint(os.path.join(checkpoint_dir, f"{i}.json"), batch)
+
+    texts_done = sum(len(batch) for batch, vectors in zip(batches, results) if vectors is not None)
+    if on_progress and texts_done:
+        on_progress(texts_done, len(texts))
+
+    semaphore = asyncio.Semaphore(max_concurrency)
+    scheduler = _RateLimitScheduler(base_delay)
+
+    async def run(i):
+        nonlocal texts_done
+        batch = batches[i]
+        async with semaphore:
+            for attempt in range(max_retries + 1):
+                await scheduler.wait()
+                try:
+                    vectors = await asyncio.to_thread(backend.embed_documents, batch)
+                    break
+                except Exception as e:
+                    if attempt == max_retries or not is_rate_limit_error(e):
+                        raise
+                    scheduler.back_off(attempt)
+        if checkpoint_dir:
+            _save_checkpoint(os.path.join(checkpoint_dir, f"{i}.json"), batch, vectors)
+        results[i] = vectors
+        texts_done += len(batch)
+        if on_progress:
+            on_progress(texts_done, len(texts))
+
+    await asyncio.gather(*(run(i) for i, vectors in enumerate(results) if vectors is None))
+    return [vector for vectors in results for vector in vectors]
+
+def embed_texts(texts, backend, **kwargs):
+    """Synchronous wrapper around embed_texts_async"""
+    return asyncio.run(embed_texts_async(texts, backend, **kwargs))
+
+def clear_checkpoint(checkpoint_key):
+    """Remove the checkpoints of a finished ingest"""
+    shutil.rmtree(os.path.join(CHECKPOINT_DIR, checkpoint_key), ignore_errors=True)
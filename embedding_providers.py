@@ -0,0 +1,4 @@
+# Embedding provider names, kept apart from embedding.py so reading them
+# (e.g. to describe an index on the first render) does not import NumPy or LangChain
+EMBEDDING_PROVIDERS = ("google", "hashing", "sentence-transformers")
+DEFAULT_EMBEDDING_PROVIDER = "google"
@@ -0,0 +1,202 @@
+import math
+import os
+import time
+
+import faiss
+import numpy as np
+
+INDEX_TYPES = ("flat", "ivf_flat", "hnsw", "ivf_pq")
+DEFAULT_INDEX_TYPE = "flat"
+
+# IVF training wants roughly this many vectors per list
+MIN_POINTS_PER_LIST = 39
+# Default nprobe is nlist / this, but at least IVF_MIN_NPROBE lists
+IVF_NPROBE_DIVISOR = 8
+IVF_MIN_NPROBE = 8
+# An IVF index is retrained once its ideal nlist is this many times the trained one
+IVF_RETRAIN_FACTOR = 2
+# 8-bit PQ codebooks have 256 centroids per sub-quantizer
+PQ_MIN_TRAINING_POINTS = 256 * MIN_POINTS_PER_LIST
+
+def index_config_from_env():
+    """Read the index type and its build/search parameters from FAISS_* environment variables"""
+    index_type = os.getenv("FAISS_INDEX_TYPE", DEFAULT_INDEX_TYPE)
+    if index_type not in INDEX_TYPES:
+        raise ValueError(f"Unknown FAISS index type: {index_type}")
+    params = {}
+    for name, env in (("nlist", "FAISS_NLIST"), ("nprobe", "FAISS_NPROBE"), ("m", "FAISS_HNSW_M"),
+                      ("ef_search", "FAISS_EF_SEARCH"), ("pq_m", "FAISS_PQ_M")):
+        if os.getenv(env):
+            params[name] = int(os.getenv(env))
+    return {"type": index_type, "params": params}
+
+def search_params_from_env():
+    """nprobe / efSearch overrides from FAISS_NPROBE and FAISS_EF_SEARCH, applied whenever an index is loaded"""
+    params = {}
+    for name, env in (("nprobe", "FAISS_NPROBE"), ("ef_search", "FAISS_EF_SEARCH")):
+        if os.getenv(env):
+            params[name] = int(os.getenv(env))
+    return params
+
+def _ivf_nlist(n, requested=None):
+    # About 4 * sqrt(n) lists, with enough vectors per list to train them
+    return min(requested or max(1, int(4 * math.sqrt(n))), n // MIN_POINTS_PER_LIST)
+
+def needs_retraining(config, ntotal, requested_nlist=None):
+    """Whether an IVF index has outgrown the nlist it was trained with and should be rebuilt
+
+    Vectors added to a trained IVF index only go to its existing lists, so a
+    corpus that grows from hundreds to many thousands of chunks would end up
+    with a few huge lists. requested_nlist is a configured FAISS_NLIST.
+    """
+    if config["type"] not in ("ivf_flat", "ivf_pq"):
+        return False
+    trained = config.get("params", {}).get("nlist", 1)
+    return _ivf_nlist(ntotal, requested_nlist) > IVF_RETRAIN_FACTOR * trained
+
+def _pq_subquantizers(dimensions, requested):
+    # PQ needs a sub-quantizer count that divides the dimension
+    m = requested or max(1, dimensions // 8)
+    while dimensions % m:
+        m -= 1
+    return m
+
+def build_faiss_index(vectors, config):
+    """Build and train a FAISS index of the configured type over vectors (L2 metric)
+
+    Returns (index, effective config). IVF-PQ falls back to IVF-Flat, and IVF
+    to a flat index, when there are too few vectors to train them.
+    """
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    n, dimensions = vectors.shape
+    index_type = config["type"]
+    params = dict(config.get("params", {}))
+
+    if index_type == "ivf_pq" and n < PQ_MIN_TRAINING_POINTS:
+        index_type = "ivf_flat"
+    if index_type in ("ivf_flat", "ivf_pq"):
+        nlist = _ivf_nlist(n, params.get("nlist"))
+        if nlist < 1:
+            index_type = "flat"
+        else:
+            params["nlist"] = nlist
+            params.setdefault("nprobe", min(nlist, max(IVF_MIN_NPROBE, nlist // IVF_NPROBE_DIVISOR)))
+
+    if index_type == "flat":
+        index = faiss.IndexFlatL2(dimensions)
+    elif index_type == "hnsw":
+        params.setdefault("m", 32)
+        params.setdefault("ef_search", 64)
+        index = faiss.IndexHNSWFlat(dimensions, params["m"])
+    elif index_type == "ivf_flat":
+        index = faiss.index_factory(dimensions, f"IVF{params['nlist']},Flat")
+    else:
+        params["pq_m"] = _pq_subquantizers(dimensions, params.get("pq_m"))
+        index = faiss.index_factory(dimensions, f"IVF{params['nlist']},PQ{params['pq_m']}")
+
+    if not index.is_trained:
+        index.train(vectors)
+    index.add(vectors)
+    config = {"type": index_type, "params": params}
+    apply_search_params(index, config)
+    return index, config
+
+def apply_search_params(index, config):
+    """Apply nprobe / efSearch to a loaded index: FAISS_NPROBE / FAISS_EF_SEARCH if set, else the config's"""
+    params = {**config.get("params", {}), **search_params_from_env()}
+    if config["type"] in ("ivf_flat", "ivf_pq"):
+        ivf = faiss.extract_index_ivf(index)
+        ivf.nprobe = params.get("nprobe", 1)
+        # Needed to reconstruct vectors (e.g. for quiz chunk sampling)
+        ivf.make_direct_map()
+    elif config["type"] == "hnsw":
+        index.hnsw.efSearch = params.get("ef_search", 64)
+
+def search_parameters(index, ids):
+    """SearchParameters that restrict a search to the given ids
+
+    A filter that keeps a fraction f of the vectors leaves only about f of the
+    candidates an unfiltered search would visit, so nprobe and efSearch are
+    divided by f (capped at a full scan) to keep the filtered recall close
+    to the unfiltered one.
+    """
+    ids = np.ascontiguousarray(ids, dtype=np.int64)
+    selector = faiss.IDSelectorBatch(ids)
+    scale = index.ntotal / max(1, len(ids))
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None:
+        return faiss.SearchParametersIVF(sel=selector, nprobe=min(ivf.nlist, math.ceil(ivf.nprobe * scale)))
+    if hasattr(index, "hnsw"):
+        return faiss.SearchParametersHNSW(sel=selector, efSearch=min(index.ntotal, math.ceil(index.hnsw.efSearch * scale)))
+    return faiss.SearchParameters(sel=selector)
+
+def supports_remove(config):
+    """Only the flat index renumbers vectors on removal the way LangChain's FAISS.delete expects
+
+    HNSW graphs cannot delete at all and IVF indexes keep their original
+    labels, so those types are rebuilt instead.
+    """
+    return config["type"] == "flat"
+
+def _filtered_truth(vectors, queries, groups, k):
+    # Exact top-k of each query within its group (query i is filtered to groups[i % len(groups)])
+    truth = []
+    for i, query in enumerate(queries):
+        ids = groups[i % len(groups)]
+        distances = ((vectors[ids] - query) ** 2).sum(axis=1)
+        truth.append(ids[np.argsort(distances)[:k]])
+    return truth
+
+def recall_latency_report(vectors, queries, configs, k=10, groups=None):
+    """Compare index configs against the exact index on recall@k and per-query latency
+
+    Returns one dict per config with build time, recall@k, mean and p95
+    query latency in milliseconds, and index size in bytes. With groups
+    (arrays of vector ids, e.g. one per document) each query is also run
+    filtered to one group, cycling through them, and filtered_recall@k and
+    filtered_mean_ms are reported.
+    """
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    queries = np.ascontiguousarray(queries, dtype=np.float32)
+    exact = faiss.IndexFlatL2(vectors.shape[1])
+    exact.add(vectors)
+    _, truth = exact.search(queries, k)
+    if groups:
+        groups = [np.asarray(ids, dtype=np.int64) for ids in groups]
+        filtered_truth = _filtered_truth(vectors, queries, groups, k)
+
+    report = []
+    for config in configs:
+        started = time.perf_counter()
+        index, effective = build_faiss_index(vectors, config)
+        build_seconds = time.perf_counter() - started
+
+        latencies = []
+        hits = 0
+        for query, expected in zip(queries, truth):
+            started = time.perf_counter()
+            _, found = index.search(query[None, :], k)
+            latencies.append((time.perf_counter() - started) * 1000)
+            hits += len(set(found[0]) & set(expected))
+
+        row = {
+            "config": effective,
+            "build_seconds": round(build_seconds, 4),
+            f"recall@{k}": round(hits / (len(queries) * k), 4),
+            "mean_ms": round(float(np.mean(latencies)), 4),
+            "p95_ms": round(float(np.percentile(latencies, 95)), 4),
+            "size_bytes": int(faiss.serialize_index(index).nbytes),
+        }
+        if groups:
+            latencies, hits, expected_hits = [], 0, 0
+            for i, (query, expected) in enumerate(zip(queries, filtered_truth)):
+                params = search_parameters(index, groups[i % len(groups)])
+                started = time.perf_counter()
+                _, found = index.search(query[None, :], k, params=params)
+                latencies.append((time.perf_counter() - started) * 1000)
+                hits += len(set(found[0]) & set(expected))
+                expected_hits += len(expected)
+            row[f"filtered_recall@{k}"] = round(hits / max(1, expected_hits), 4)
+            row["filtered_mean_ms"] = round(float(np.mean(latencies)), 4)
+        report.append(row)
+    return report
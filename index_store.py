@@ -0,0 +1,160 @@
+import os
+import re
+import shutil
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:
+    # Windows: writers are only serialised within the process
+    fcntl = None
+
+INDEX_ROOT = "indexes"
+DEFAULT_NAMESPACE = "default"
+
+# Directory used before indexes were namespaced; adopted as the default namespace
+LEGACY_INDEX_DIR = "faiss_index"
+
+# Names a user or corpus may use as an index namespace
+NAMESPACE_PATTERN = re.compile(r"^[A-Za-z0-9][A-Za-z0-9_.-]{0,63}$")
+
+CURRENT_FILE = "CURRENT"
+VERSIONS_DIR = "versions"
+
+# Published versions kept besides the current one, for readers still loading them
+KEEP_OLD_VERSIONS = 2
+
+# Writer lock files, outside the namespace directories that remove_namespace deletes
+LOCKS_DIR = ".locks"
+
+# Namespaces whose writer lock the current thread holds, with their nesting depth
+_held_locks = threading.local()
+
+def validate_namespace(namespace):
+    """Return namespace if it is a valid name, otherwise raise ValueError"""
+    if not isinstance(namespace, str) or not NAMESPACE_PATTERN.match(namespace):
+        raise ValueError(f"Invalid index namespace: {namespace!r}")
+    return namespace
+
+def namespace_dir(namespace):
+    return os.path.join(INDEX_ROOT, validate_namespace(namespace))
+
+def list_namespaces():
+    """Namespaces that currently have a published index"""
+    if not os.path.isdir(INDEX_ROOT):
+        return []
+    return sorted(
+        name for name in os.listdir(INDEX_ROOT)
+        if NAMESPACE_PATTERN.match(name) and os.path.exists(os.path.join(INDEX_ROOT, name, CURRENT_FILE))
+    )
+
+def current_version(namespace):
+    """Return the id of the namespace's published index version, or None"""
+    path = os.path.join(namespace_dir(namespace), CURRENT_FILE)
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return f.read().strip() or None
+    except OSError:
+        if namespace == DEFAULT_NAMESPACE and os.path.isdir(LEGACY_INDEX_DIR):
+            return _adopt_legacy_index()
+        return None
+
+def current_dir(namespace):
+    """Return the directory of the namespace's published index, or None"""
+    version = current_version(namespace)
+    if version is None:
+        return None
+    return os.path.join(namespace_dir(namespace), VERSIONS_DIR, version)
+
+@contextmanager
+def writer_lock(namespace):
+    """Serialise the writers of a namespace across threads and processes (e.g. gunicorn workers)
+
+    Hold it from reading the manifest to publishing the new version, so two
+    writers never start from the same manifest and drop each other's
+    documents. Reentrant within a thread; readers never need it.
+    """
+    held = _held_locks.__dict__.setdefault("namespaces", {})
+    if held.get(namespace):
+        held[namespace] += 1
+        try:
+            yield
+        finally:
+            held[namespace] -= 1
+        return
+
+    locks = os.path.join(INDEX_ROOT, LOCKS_DIR)
+    os.makedirs(locks, exist_ok=True)
+    # flock locks belong to the open file, so threads of one process exclude each other too
+    with open(os.path.join(locks, f"{validate_namespace(namespace)}.lock"), "a") as f:
+        if fcntl is not None:
+            fcntl.flock(f, fcntl.LOCK_EX)
+        held[namespace] = 1
+        try:
+            yield
+        finally:
+            del held[namespace]
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+def _new_version_id():
+    # Sorts by creation time; the suffix keeps concurrent writers apart
+    return f"{time.time_ns():020d}-{uuid.uuid4().hex[:8]}"
+
+@contextmanager
+def publish(namespace):
+    """Yield an empty directory to write a new index version into, then publish it
+
+    The version is written under a staging name, renamed into place and made
+    current by atomically replacing the CURRENT pointer, so readers only
+    ever see a complete index. Nothing is published if the block raises.
+    """
+    versions = os.path.join(namespace_dir(namespace), VERSIONS_DIR)
+    os.makedirs(versions, exist_ok=True)
+    version = _new_version_id()
+    staging = os.path.join(versions, f".staging-{version}")
+    os.makedirs(staging)
+    try:
+        yield staging
+        os.rename(staging, os.path.join(versions, version))
+    except BaseException:
+        shutil.rmtree(staging, ignore_errors=True)
+        raise
+
+    pointer = os.path.join(namespace_dir(namespace), CURRENT_FILE)
+    tmp_pointer = f"{pointer}.{version}.tmp"
+    with open(tmp_pointer, "w", encoding="utf-8") as f:
+        f.write(version)
+    os.replace(tmp_pointer, pointer)
+    _remove_old_versions(namespace, version)
+
+def _remove_old_versions(namespace, current):
+    versions = os.path.join(namespace_dir(namespace), VERSIONS_DIR)
+    old = sorted(name for name in os.listdir(versions) if name != current and not name.startswith("."))
+    for name in old[:max(len(old) - KEEP_OLD_VERSIONS, 0)]:
+        shutil.rmtree(os.path.join(versions, name), ignore_errors=True)
+
+def remove_namespace(namespace):
+    """Unpublish a namespace's index and delete all of its versions"""
+    directory = namespace_dir(namespace)
+    try:
+        # Readers see "no index" from here on
+        os.remove(os.path.join(directory, CURRENT_FILE))
+    except OSError:
+        pass
+    shutil.rmtree(directory, ignore_errors=True)
+    if namespace == DEFAULT_NAMESPACE:
+        shutil.rmtree(LEGACY_INDEX_DIR, ignore_errors=True)
+
+def _adopt_legacy_index():
+    # Publish the pre-namespace faiss_index directory as the default namespace once
+    with writer_lock(DEFAULT_NAMESPACE):
+        if os.path.isdir(LEGACY_INDEX_DIR):
+            with publish(DEFAULT_NAMESPACE) as directory:
+                for name in os.listdir(LEGACY_INDEX_DIR):
+                    shutil.copy2(os.path.join(LEGACY_INDEX_DIR, name), directory)
+            shutil.rmtree(LEGACY_INDEX_DIR, ignore_errors=True)
+    return current_version(DEFAULT_NAMESPACE)
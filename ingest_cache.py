@@ -0,0 +1,69 @@
+import hashlib
+import json
+import os
+
+from chunking import CHUNKER_VERSION
+
+CACHE_DIR = "ingest_cache"
+
+def _chunks_path(digest):
+    return os.path.join(CACHE_DIR, f"{digest}.json")
+
+def _vectors_path(digest, provider):
+    return os.path.join(CACHE_DIR, f"{digest}.{provider}.json")
+
+def _read_json(path):
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        # A corrupt entry is treated as a miss and rebuilt
+        return None
+
+def _write_json(path, value):
+    # Write to a temporary file first so readers never see a partial entry
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(value, f)
+    os.replace(tmp_path, path)
+
+def _chunks_digest(chunks):
+    digest = hashlib.sha256()
+    for chunk in chunks:
+        digest.update(chunk.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+def load_cached_chunks(digest):
+    """Return the cached name, chunks and chunk pages for a file hash, or None
+
+    Entries written by a different chunker version are treated as a miss.
+    """
+    entry = _read_json(_chunks_path(digest))
+    if entry is None or entry.get("chunker") != CHUNKER_VERSION:
+        return None
+    return {"name": entry["name"], "chunks": entry["chunks"], "pages": entry["pages"]}
+
+def load_cached_document(digest, provider):
+    """Return the cached chunks and a provider's embeddings for a file hash, or None"""
+    entry = load_cached_chunks(digest)
+    vectors = _read_json(_vectors_path(digest, provider))
+    if entry is None or not isinstance(vectors, dict) or vectors.get("chunks") != _chunks_digest(entry["chunks"]):
+        return None
+    entry["embeddings"] = vectors["vectors"]
+    return entry
+
+def save_cached_document(digest, name, chunks, pages, embeddings, provider):
+    """Persist the ingestion results for a file hash
+
+    Chunks and their page numbers are shared by every embedding provider;
+    vectors are stored per provider, tagged with a hash of the chunks they
+    embed. The extracted page text itself lives in the upload store.
+    """
+    _write_json(_chunks_path(digest), {"name": name, "chunker": CHUNKER_VERSION, "chunks": chunks, "pages": pages})
+    vectors = [list(map(float, vector)) for vector in embeddings]
+    _write_json(_vectors_path(digest, provider), {"chunks": _chunks_digest(chunks), "vectors": vectors})
+    return {"name": name, "chunks": chunks, "pages": pages, "embeddings": vectors}
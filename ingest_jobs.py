@@ -0,0 +1,257 @@
+import json
+import logging
+import os
+import socket
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:
+    # Windows: job files are only locked within the process
+    fcntl = None
+
+import telemetry
+from index_store import DEFAULT_NAMESPACE
+
+logger = logging.getLogger(__name__)
+
+JOBS_DIR = "ingest_jobs"
+
+# One worker: jobs write the shared index, and each already parses in a process pool
+INGEST_WORKERS = 1
+
+# A job moves through these in order, or ends as "failed" / "cancelled"
+JOB_STAGES = ("queued", "parsing", "embedding", "indexing", "done")
+FINISHED_STATUSES = ("done", "failed", "cancelled")
+STAGE_UNITS = {"parsing": "pages", "embedding": "chunks", "indexing": "steps"}
+
+# Finished jobs kept on disk; older ones are pruned
+MAX_FINISHED_JOBS = 50
+
+# Seconds between progress writes
+SAVE_INTERVAL = 0.5
+
+# Seconds between heartbeats of the jobs a process owns, and the silence after which its owner is presumed gone
+HEARTBEAT_INTERVAL = 5.0
+STALE_AFTER = 30.0
+
+class JobCancelled(Exception):
+    """Raised from a job's progress callback once cancellation is requested"""
+
+_executor = ThreadPoolExecutor(max_workers=INGEST_WORKERS, thread_name_prefix="ingest")
+_lock = threading.Lock()
+_resumed = False
+
+# Unfinished jobs queued or running in this process, kept alive by the heartbeat thread
+_owned = set()
+_heartbeat = None
+
+def _job_path(job_id):
+    return os.path.join(JOBS_DIR, f"{job_id}.json")
+
+def load_job(job_id):
+    """Return a job's persisted state, or None"""
+    try:
+        with open(_job_path(job_id), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def _save_job(job):
+    # Written atomically so pollers never read a partial file
+    os.makedirs(JOBS_DIR, exist_ok=True)
+    job["updated"] = time.time()
+    path = _job_path(job["id"])
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(job, f)
+    os.replace(tmp_path, path)
+
+@contextmanager
+def _locked():
+    """Exclude other threads and processes (e.g. gunicorn workers) while job files are read and rewritten"""
+    with _lock:
+        os.makedirs(JOBS_DIR, exist_ok=True)
+        with open(os.path.join(JOBS_DIR, ".lock"), "a") as f:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(f, fcntl.LOCK_UN)
+
+def _owner():
+    return {"host": socket.gethostname(), "pid": os.getpid()}
+
+def _owner_alive(job):
+    """Whether the process that owns an unfinished job is still running it"""
+    owner = job.get("owner")
+    if not owner:
+        return False
+    if owner == _owner():
+        # Only the jobs this process queued itself; the pid may be a reused one
+        return job["id"] in _owned
+    if time.time() - job.get("updated", 0) > STALE_AFTER:
+        return False
+    if owner["host"] == socket.gethostname():
+        try:
+            os.kill(owner["pid"], 0)
+        except ProcessLookupError:
+            return False
+        except PermissionError:
+            pass
+    return True
+
+def _beat():
+    # Refresh "updated" on owned jobs so other processes do not resume them
+    while True:
+        time.sleep(HEARTBEAT_INTERVAL)
+        with _locked():
+            for job_id in list(_owned):
+                job = load_job(job_id)
+                if job is None or job["status"] in FINISHED_STATUSES or job.get("owner") != _owner():
+                    _owned.discard(job_id)
+                    continue
+                _save_job(job)
+
+def _own(job):
+    """Claim a job for this process (call with _locked() held) and start heartbeats"""
+    global _heartbeat
+    job["owner"] = _owner()
+    _owned.add(job["id"])
+    if _heartbeat is None:
+        _heartbeat = threading.Thread(target=_beat, name="ingest-heartbeat", daemon=True)
+        _heartbeat.start()
+
+def list_jobs(namespace=None):
+    """Persisted jobs, newest first, optionally only those for one index namespace"""
+    if not os.path.isdir(JOBS_DIR):
+        return []
+    jobs = [load_job(name[:-len(".json")]) for name in os.listdir(JOBS_DIR) if name.endswith(".json")]
+    jobs = [job for job in jobs if job and namespace in (None, job.get("namespace", DEFAULT_NAMESPACE))]
+    return sorted(jobs, key=lambda job: job["created"], reverse=True)
+
+def _prune_finished():
+    finished = [job for job in list_jobs() if job["status"] in FINISHED_STATUSES]
+    for job in finished[MAX_FINISHED_JOBS:]:
+        try:
+            os.remove(_job_path(job["id"]))
+        except OSError:
+            pass
+
+def submit_job(files, api_key, namespace=DEFAULT_NAMESPACE):
+    """Queue already spooled files ([{"digest", "name"}]) for ingestion into a namespace and return the job"""
+    job = {
+        "id": uuid.uuid4().hex,
+        "namespace": namespace,
+        "files": files,
+        "status": "queued",
+        "progress": {},
+        "created": time.time(),
+        "finished": None,
+        "cancel_requested": False,
+        "added_chunks": 0,
+        "error": None,
+    }
+    with _locked():
+        _own(job)
+        _save_job(job)
+    _executor.submit(_run_job, job["id"], api_key)
+    return job
+
+def cancel_job(job_id):
+    """Ask a job to stop; a queued job is cancelled at once, a running one at its next progress update"""
+    with _locked():
+        job = load_job(job_id)
+        if job is None or job["status"] in FINISHED_STATUSES:
+            return job
+        job["cancel_requested"] = True
+        if job["status"] == "queued":
+            job["status"] = "cancelled"
+            job["finished"] = time.time()
+        _save_job(job)
+        return job
+
+def resume_jobs(api_key):
+    """Requeue jobs left unfinished by a process that is gone (once per process)
+
+    Jobs whose owner still heartbeats, such as those of sibling gunicorn
+    workers, are left alone. Uploads are already in the upload store and
+    finished embedding batches are checkpointed, so a resumed job skips the
+    work that was done.
+    """
+    global _resumed
+    with _locked():
+        if _resumed:
+            return
+        _resumed = True
+        pending = [job for job in list_jobs() if job["status"] not in FINISHED_STATUSES and not _owner_alive(job)]
+        for job in pending:
+            job["status"] = "queued"
+            job["progress"] = {}
+            _own(job)
+            _save_job(job)
+    for job in sorted(pending, key=lambda job: job["created"]):
+        _executor.submit(_run_job, job["id"], api_key)
+
+def _run_job(job_id, api_key):
+    from utils import ingest_documents
+
+    with _locked():
+        job = load_job(job_id)
+        if job is None or job["status"] != "queued" or job.get("owner") != _owner():
+            _owned.discard(job_id)
+            return
+    stage_started = time.monotonic()
+    last_saved = 0.0
+
+    def on_progress(stage, done, total):
+        nonlocal stage_started, last_saved
+        now = time.monotonic()
+        if stage != job["status"]:
+            job["status"] = stage
+            stage_started = now
+            last_saved = 0.0
+        elif now - last_saved < SAVE_INTERVAL and done < total:
+            return
+        elapsed = now - stage_started
+        rate = done / elapsed if done and elapsed > 0 else 0.0
+        job["progress"] = {
+            "done": done,
+            "total": total,
+            "unit": STAGE_UNITS[stage],
+            "rate": round(rate, 2),
+            "eta_seconds": round((total - done) / rate, 1) if rate else None,
+        }
+        with _locked():
+            # Pick up a cancellation requested by another thread or process
+            saved = load_job(job_id)
+            if saved is not None and saved.get("cancel_requested"):
+                job["cancel_requested"] = True
+                raise JobCancelled()
+            _save_job(job)
+        last_saved = now
+
+    try:
+        namespace = job.get("namespace", DEFAULT_NAMESPACE)
+        with telemetry.trace("ingest", job=job_id, namespace=namespace, documents=len(job["files"])) as trace:
+            # Parsing is the first stage even when everything comes from the cache
+            on_progress("parsing", 0, 0)
+            result = ingest_documents(job["files"], api_key, on_progress=on_progress, namespace=namespace)
+            trace.set(chunks=result["added_chunks"])
+        job.update(status="done", progress={}, added_chunks=result["added_chunks"])
+    except JobCancelled:
+        job["status"] = "cancelled"
+    except Exception as e:
+        logger.exception("Ingestion job %s failed", job_id)
+        job.update(status="failed", error=str(e))
+    job["finished"] = time.time()
+    with _locked():
+        _save_job(job)
+        _owned.discard(job_id)
+    _prune_finished()
@@ -1,8 +1,21 @@
 import streamlit as st
+import contextvars
 import os
-import random
+import json
 import re
-from langchain_google_genai import ChatGoogleGenerativeAI
+import uuid
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import telemetry
+from index_store import DEFAULT_NAMESPACE
+
+# Characters of document excerpts sent with each quiz prompt
+QUIZ_CONTEXT_CHARS = 20000
+
+# Questions requested per concurrent model call
+QUIZ_SHARD_SIZE = 2
+
+# Follow-up requests for malformed questions, per shard
+QUIZ_MAX_REPAIRS = 2
 
 def quiz_interface():
     """Interface for the quiz generation functionality"""
@@ -29,10 +42,148 @@ def quiz_interface():
     
     # Display quiz if available
     if st.session_state.quiz_questions:
+        stats = st.session_state.get("quiz_stats")
+        if stats and (stats["parse_failures"] or stats["repairs"]):
+            st.caption(f"{stats['parse_failures']} malformed question(s) repaired with {stats['repairs']} follow-up request(s)")
         display_quiz()
     
     st.markdown('</div>', unsafe_allow_html=True)
 
+def build_quiz_prompt(num_questions, difficulty, content, avoid=()):
+    """Build the JSON MCQ generation prompt for a set of document excerpts"""
+    prompt = f"""
+    Generate {num_questions} multiple-choice questions (MCQs) based on the content of the document.
+    
+    Difficulty level: {difficulty}
+    
+    For each question:
+    1. Create a clear question related to important concepts in the document
+    2. Provide exactly 4 possible answers
+    3. Only ONE answer should be correct
+    4. Give the 0-based position of the correct answer in "answer"
+    
+    Respond with a JSON array only, formatted exactly like this example:
+    
+    [
+      {{"question": "What is the capital of France?", "options": ["Berlin", "Madrid", "Paris", "Rome"], "answer": 2}}
+    ]
+    
+    Make sure each question is distinct, relevant, and tests understanding rather than just memory.
+    """
+    if avoid:
+        prompt += "\nDo not repeat any of these questions:\n" + "\n".join(f"- {question}" for question in avoid) + "\n"
+    return prompt + "\n\nDocument content (excerpts):\n" + content
+
+def split_into_shards(num_questions, docs):
+    """Split the question count and excerpts into shards of about QUIZ_SHARD_SIZE questions"""
+    n_shards = max(1, min(-(-num_questions // QUIZ_SHARD_SIZE), len(docs) or 1))
+    return [
+        (len(range(i, num_questions, n_shards)), docs[i::n_shards])
+        for i in range(n_shards)
+    ]
+
+def create_quiz_model(api_key):
+    """Create the Gemini model used for quiz generation, constrained to JSON output"""
+    from langchain_google_genai import ChatGoogleGenerativeAI
+    
+    return ChatGoogleGenerativeAI(
+        model="models/gemini-1.5-flash",
+        temperature=0.7,
+        google_api_key=api_key,
+        response_mime_type="application/json"
+    )
+
+@st.cache_resource(show_spinner=False)
+def get_quiz_model(api_key):
+    """Quiz model shared per process"""
+    return create_quiz_model(api_key)
+
+def generate_quiz_shard(model, num_questions, difficulty, content):
+    """Generate one shard of questions, re-requesting only the malformed ones
+
+    Returns (parsed questions, parse failures, repair requests).
+    """
+    parsed, failures, repairs = [], 0, 0
+    missing = num_questions
+    with telemetry.span("quiz.llm", requested=num_questions) as span:
+        for attempt in range(QUIZ_MAX_REPAIRS + 1):
+            avoid = [question["question"] for question, _ in parsed]
+            reply = model.invoke(build_quiz_prompt(missing, difficulty, content, avoid=avoid)).content
+            valid, invalid = parse_quiz_json(reply)
+            parsed += valid[:missing]
+            # Items that were malformed or never produced both count as failures
+            failures += max(invalid, missing - len(valid))
+            missing = num_questions - len(parsed)
+            if missing <= 0 or attempt == QUIZ_MAX_REPAIRS:
+                break
+            repairs += 1
+        span.set(questions=len(parsed), parse_failures=failures, repairs=repairs)
+    return parsed, failures, repairs
+
+def build_quiz(num_questions, difficulty, api_key, served_ids, on_question=None, namespace=DEFAULT_NAMESPACE):
+    """Build a quiz from a namespace's documents without any Streamlit UI
+
+    Questions come from the pre-generated bank when it has enough that are
+    not in served_ids, otherwise from concurrent model calls over excerpts
+    spread across the index. on_question(question, answer) is called as
+    each generated question arrives. Returns (questions, answers, stats).
+    """
+    # Serve the quiz instantly from the pre-generated bank when it has enough questions
+    from utils import load_index_manifest
+    from quiz_bank import take_questions
+    with telemetry.span("quiz.bank") as span:
+        digests = list(load_index_manifest(namespace)["documents"])
+        banked = take_questions(digests, difficulty, num_questions, served_ids, api_key)
+        span.set(cache_hit=bool(banked))
+    if banked:
+        return [question for question, _ in banked], [answer for _, answer in banked], {"parse_failures": 0, "repairs": 0}
+    
+    # Create the model, constrained to JSON output
+    model = get_quiz_model(api_key)
+    
+    # Sample excerpts spread across every processed document
+    from utils import load_vector_store, sample_diverse_chunks
+    with telemetry.span("quiz.load_index"):
+        vector_store = load_vector_store(api_key, namespace)
+    with telemetry.span("quiz.sample") as span:
+        docs = sample_diverse_chunks(vector_store, num_questions)
+        span.set(chunks=len(docs))
+    
+    # Give each excerpt an equal share of the context budget
+    excerpt_length = QUIZ_CONTEXT_CHARS // max(len(docs), 1)
+    
+    # Each shard asks for a few questions about its own excerpts
+    shards = []
+    for shard_questions, shard_docs in split_into_shards(num_questions, docs):
+        content = "\n\n---\n\n".join(doc.page_content[:excerpt_length] for doc in shard_docs)
+        shards.append((shard_questions, content))
+    
+    # Collect questions as each shard returns
+    questions, answers = [], []
+    stats = {"parse_failures": 0, "repairs": 0}
+    seen = set()
+    with ThreadPoolExecutor(max_workers=len(shards)) as executor:
+        # Each shard runs in a copy of the caller's context so its span joins the caller's trace
+        futures = [
+            executor.submit(contextvars.copy_context().run, generate_quiz_shard, model, shard_questions, difficulty, content)
+            for shard_questions, content in shards
+        ]
+        for future in as_completed(futures):
+            parsed, failures, repairs = future.result()
+            stats["parse_failures"] += failures
+            stats["repairs"] += repairs
+            for question, answer in parsed:
+                # Drop questions another shard already produced
+                key = re.sub(r"\W+", " ", question["question"].lower()).strip()
+                if key in seen:
+                    continue
+                seen.add(key)
+                questions.append(question)
+                answers.append(answer)
+                if on_question is not None:
+                    on_question(question, answer)
+    return questions, answers, stats
+
 def generate_quiz(num_questions, difficulty):
     """Generate MCQ quiz questions based on document content"""
     # Check if documents have been processed
@@ -41,110 +192,122 @@ def generate_quiz(num_questions, difficulty):
         return
     
     try:
-        with st.spinner(f"Generating {num_questions} {difficulty.lower()}-level questions..."):
-            # Get API key
-            api_key = os.getenv("GOOGLE_API_KEY")
-            
-            # Create the model
-            model = ChatGoogleGenerativeAI(
-                model="models/gemini-1.5-flash",
-                temperature=0.7,
-                google_api_key=api_key
-            )
-            
-            # Create the prompt
-            prompt = f"""
-            Generate {num_questions} multiple-choice questions (MCQs) based on the content of the document.
-            
-            Difficulty level: {difficulty}
-            
-            For each question:
-            1. Create a clear question related to important concepts in the document
-            2. Provide 4 possible answers (A, B, C, D)
-            3. Only ONE answer should be correct
-            4. Mark the correct answer with a * at the beginning
-            
-            Format each question exactly like this example:
-            
-            Q1: What is the capital of France?
-            A) Berlin
-            B) Madrid
-            C) *Paris
-            D) Rome
-            
-            Make sure each question is distinct, relevant, and tests understanding rather than just memory.
-            """
-            
-            # Load the vector store to access document content
-            from utils import get_pdf_text
-            
-            # Get text from PDFs (assuming PDFs are stored in session state)
-            if hasattr(st.session_state, 'pdf_content'):
-
-                
-                from io import BytesIO
-                pdf_file = BytesIO(st.session_state.pdf_content)
-                content = get_pdf_text([pdf_file])
-                
-                # Limit content length for API
-                max_length = 50000
-                if len(content) > max_length:
-                    content = content[:max_length]
-                
-                # Add content to prompt
-                full_prompt = prompt + "\n\nDocument content (extract):\n" + content
-                
-                # Generate questions
-                response = model.invoke(full_prompt)
-                quiz_text = response.content
-                
-                # Extract questions and answers
-                process_quiz_response(quiz_text)
+        with st.spinner(f"Generating {num_questions} {difficulty.lower()}-level questions..."), \
+                telemetry.trace("quiz", requested=num_questions, difficulty=difficulty):
+            from utils import get_api_client, get_namespace
+            client = get_api_client()
+            if client is not None:
+                # The serving API tracks served questions per session id
+                session_id = st.session_state.setdefault("session_id", uuid.uuid4().hex)
+                with telemetry.span("quiz.remote"):
+                    quiz = client.quiz(num_questions, difficulty, session_id, get_namespace())
+                questions, answers, stats = quiz["questions"], quiz["answers"], quiz["stats"]
             else:
-                st.error("Cannot access PDF content. Please re-upload a single PDF file.")
+                # Reset the quiz and fill it in as each question arrives
+                start_quiz([], [])
+                preview = st.empty()
+
+                def show_question(question, answer):
+                    add_quiz_question(question, answer)
+                    preview.markdown("\n".join(
+                        f"**Question {i + 1}:** {q['question']}"
+                        for i, q in enumerate(st.session_state.quiz_questions)
+                    ))
+
+                served_ids = st.session_state.setdefault("quiz_served_ids", set())
+                questions, answers, stats = build_quiz(
+                    num_questions, difficulty, os.getenv("GOOGLE_API_KEY"), served_ids,
+                    on_question=show_question, namespace=get_namespace()
+                )
+                preview.empty()
+            
+            start_quiz(questions, answers)
+            st.session_state.quiz_stats = stats
+            st.success(f"✅ Generated {len(questions)} questions!")
     
     except Exception as e:
         st.error(f"Error generating quiz: {str(e)}")
 
-def process_quiz_response(quiz_text):
-    """Process the quiz response from the AI"""
-    # Extract questions and options
-    questions = []
-    answers = []
-    
-    # Use regex to extract questions and options
-    pattern = r'Q\d+: (.*?)\nA\) (.*?)\nB\) (.*?)\nC\) (.*?)\nD\) (.*?)(?=\n\n|\Z)'
-    matches = re.findall(pattern, quiz_text, re.DOTALL)
-    
-    for match in matches:
-        question = match[0].strip()
-        options = [match[1].strip(), match[2].strip(), match[3].strip(), match[4].strip()]
-        
-        # Find the correct answer (marked with *)
-        correct_index = None
-        for i, option in enumerate(options):
-            if option.startswith('*'):
-                options[i] = option[1:].strip()  # Remove the * marker
-                correct_index = i
-                break
-        
-        # If no correct answer was marked, choose randomly (fallback)
-        if correct_index is None:
-            correct_index = random.randint(0, 3)
-        
-        questions.append({
-            'question': question,
-            'options': options
-        })
-        
-        answers.append(correct_index)
-    
-    # Save to session state
+def iter_json_objects(text):
+    """Yield the source of each complete top-level JSON object in text
+
+    Tolerates code fences, surrounding prose and a truncated tail, so it can
+    be run on a partial (streaming) reply.
+    """
+    depth = 0
+    start = None
+    in_string = False
+    escaped = False
+    for i, char in enumerate(text):
+        if in_string:
+            if escaped:
+                escaped = False
+            elif char == "\\":
+                escaped = True
+            elif char == '"':
+                in_string = False
+        elif char == '"':
+            in_string = depth > 0
+        elif char == "{":
+            if depth == 0:
+                start = i
+            depth += 1
+        elif char == "}" and depth > 0:
+            depth -= 1
+            if depth == 0:
+                yield text[start:i + 1]
+
+def validate_quiz_item(item):
+    """Return (question, correct_index) for a well-formed item, otherwise None"""
+    if not isinstance(item, dict):
+        return None
+    question = item.get("question")
+    options = item.get("options")
+    answer = item.get("answer")
+    if not isinstance(question, str) or not question.strip():
+        return None
+    if not isinstance(options, list) or len(options) != 4:
+        return None
+    if not all(isinstance(option, str) and option.strip() for option in options):
+        return None
+    # Accept a letter as well as an index for the correct answer
+    if isinstance(answer, str) and answer.strip().upper() in ("A", "B", "C", "D"):
+        answer = "ABCD".index(answer.strip().upper())
+    if isinstance(answer, bool) or not isinstance(answer, int) or not 0 <= answer < 4:
+        return None
+    # Strip "A) " style prefixes the model sometimes adds
+    options = [re.sub(r"^[A-D][).:]\s+", "", option.strip()) for option in options]
+    if len(set(options)) != 4:
+        return None
+    return {'question': question.strip(), 'options': options}, answer
+
+def parse_quiz_json(quiz_text):
+    """Parse a JSON model reply into (valid (question, correct_index) pairs, malformed item count)"""
+    parsed = []
+    invalid = 0
+    for source in iter_json_objects(quiz_text):
+        try:
+            item = validate_quiz_item(json.loads(source))
+        except ValueError:
+            item = None
+        if item is None:
+            invalid += 1
+        else:
+            parsed.append(item)
+    return parsed, invalid
+
+def start_quiz(questions, answers):
+    """Replace the quiz in session state"""
     st.session_state.quiz_questions = questions
     st.session_state.quiz_answers = answers
     st.session_state.user_answers = [-1] * len(questions)  # Initialize with no selection
-    
-    st.success(f"✅ Generated {len(questions)} questions!")
+    st.session_state.quiz_stats = {"parse_failures": 0, "repairs": 0}
+
+def add_quiz_question(question, answer):
+    """Append a single question to the quiz in session state"""
+    st.session_state.quiz_questions.append(question)
+    st.session_state.quiz_answers.append(answer)
+    st.session_state.user_answers.append(-1)
 
 def display_quiz():
     """Display the quiz questions and options"""
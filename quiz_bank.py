@@ -0,0 +1,135 @@
+import hashlib
+import json
+import os
+import random
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import telemetry
+from ingest_cache import load_cached_chunks
+
+BANK_DIR = "quiz_bank"
+DIFFICULTIES = ("Easy", "Medium", "Hard")
+
+# Questions generated per bucket when a document is first processed
+BANK_TARGET = 20
+# Refill a bucket once fewer than this many unseen questions remain
+BANK_LOW_WATERMARK = 10
+# Questions added per refill, and the most kept per bucket
+BANK_REFILL_SIZE = 10
+BANK_MAX_SIZE = 200
+
+# Chunks shown to the model per generation request
+BANK_EXCERPTS = 4
+BANK_EXCERPT_CHARS = 4000
+
+_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="quiz-bank")
+_lock = threading.Lock()
+_pending = set()
+
+def _bank_path(digest):
+    return os.path.join(BANK_DIR, f"{digest}.json")
+
+def load_bank(digest):
+    """Return the question buckets stored for a document"""
+    try:
+        with open(_bank_path(digest), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {difficulty: [] for difficulty in DIFFICULTIES}
+
+def _save_bank(digest, bank):
+    os.makedirs(BANK_DIR, exist_ok=True)
+    path = _bank_path(digest)
+    tmp_path = f"{path}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(bank, f)
+    os.replace(tmp_path, path)
+
+def _question_key(text):
+    return re.sub(r"\W+", " ", text.lower()).strip()
+
+def add_to_bank(digest, difficulty, parsed):
+    """Store parsed (question, correct_index) pairs, skipping duplicates"""
+    with _lock:
+        bank = load_bank(digest)
+        bucket = bank.setdefault(difficulty, [])
+        known = {_question_key(item["question"]) for item in bucket}
+        for question, answer in parsed:
+            key = _question_key(question["question"])
+            if key in known:
+                continue
+            known.add(key)
+            bucket.append({
+                "id": hashlib.sha1(f"{digest}:{difficulty}:{key}".encode("utf-8")).hexdigest()[:16],
+                "question": question["question"],
+                "options": question["options"],
+                "answer": answer,
+            })
+        # Keep the newest questions when a bucket outgrows its cap
+        del bucket[:-BANK_MAX_SIZE]
+        _save_bank(digest, bank)
+
+def _fill(digest, difficulty, count, api_key):
+    from quiz import create_quiz_model, generate_quiz_shard
+
+    try:
+        entry = load_cached_chunks(digest)
+        if not entry or not entry["chunks"]:
+            return
+        chunks = random.sample(entry["chunks"], min(BANK_EXCERPTS, len(entry["chunks"])))
+        content = "\n\n---\n\n".join(chunk[:BANK_EXCERPT_CHARS] for chunk in chunks)
+        with telemetry.trace("quiz_bank.fill", requested=count, difficulty=difficulty) as trace:
+            parsed, _, _ = generate_quiz_shard(create_quiz_model(api_key), count, difficulty, content)
+            add_to_bank(digest, difficulty, parsed)
+            trace.set(questions=len(parsed))
+    finally:
+        with _lock:
+            _pending.discard((digest, difficulty))
+
+def schedule_refill(digest, difficulty, api_key, count=BANK_REFILL_SIZE):
+    """Queue background generation for a bucket unless one is already queued"""
+    with _lock:
+        if (digest, difficulty) in _pending:
+            return False
+        _pending.add((digest, difficulty))
+    _executor.submit(_fill, digest, difficulty, count, api_key)
+    return True
+
+def schedule_bank_fill(digest, api_key):
+    """Top up every difficulty bucket of a newly processed document in the background"""
+    bank = load_bank(digest)
+    for difficulty in DIFFICULTIES:
+        missing = BANK_TARGET - len(bank.get(difficulty, []))
+        if missing > 0:
+            schedule_refill(digest, difficulty, api_key, count=missing)
+
+def take_questions(digests, difficulty, count, served_ids, api_key):
+    """Sample count unseen questions across documents, refilling low buckets
+
+    Returns (question, correct_index) pairs, or [] when the bank cannot fill
+    the quiz yet. The ids of returned questions are added to served_ids so a
+    session never sees a repeat.
+    """
+    available = {}
+    for digest in digests:
+        unseen = [item for item in load_bank(digest).get(difficulty, []) if item["id"] not in served_ids]
+        random.shuffle(unseen)
+        available[digest] = unseen
+
+    # Round-robin across documents so the quiz covers the whole corpus
+    taken = []
+    while len(taken) < count and any(available.values()):
+        for digest in list(available):
+            if available[digest] and len(taken) < count:
+                taken.append(available[digest].pop())
+
+    for digest, unseen in available.items():
+        if len(unseen) < BANK_LOW_WATERMARK:
+            schedule_refill(digest, difficulty, api_key)
+
+    if len(taken) < count:
+        return []
+    served_ids.update(item["id"] for item in taken)
+    return [({'question': item["question"], 'options': item["options"]}, item["answer"]) for item in taken]
@@ -0,0 +1,341 @@
+"""Headless asyncio HTTP API for ingestion, questions and quizzes
+
+    python server.py --port 8000
+    gunicorn "server:create_app()" -k aiohttp.GunicornWebWorker -w 4 -b :8000
+
+Blocking work (FAISS, Gemini calls) runs on a shared thread pool behind
+per-endpoint concurrency limits, so the event loop keeps accepting
+requests, and uploads are queued as ingestion jobs (see ingest_jobs.py).
+Stage timings from telemetry.py are served at /metrics for Prometheus.
+Index handles, embeddings and model clients are the process-wide cached
+resources from utils.py, shared by all requests. Set ASSISTANT_API_URL for
+the Streamlit app to use this server instead of working in-process.
+"""
+import argparse
+import asyncio
+import contextvars
+import json
+import logging
+import os
+import tempfile
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from aiohttp import web
+from dotenv import load_dotenv
+
+import ingest_jobs
+import telemetry
+import utils
+from conversation import Conversation, conversation_from_env
+from index_store import DEFAULT_NAMESPACE, validate_namespace
+from chat import answer_with_chain, prepare_answer, record_answer
+from quiz import build_quiz
+from quiz_bank import DIFFICULTIES
+
+logger = logging.getLogger(__name__)
+
+# Requests allowed to run at once per endpoint; the rest wait up to SERVER_QUEUE_TIMEOUT
+SERVER_MAX_ASKS = 8
+SERVER_MAX_QUIZZES = 4
+SERVER_WORKER_THREADS = 16
+SERVER_QUEUE_TIMEOUT = 30.0
+
+# Sessions whose served quiz questions and conversations are remembered
+SERVER_MAX_SESSIONS = 1024
+
+def _env_number(name, default):
+    return type(default)(os.getenv(name, str(default)))
+
+class _Upload:
+    """A spooled multipart file with the name and file methods ingestion expects"""
+
+    def __init__(self, name, file):
+        self.name = name
+        self._file = file
+
+    def read(self, size=-1):
+        return self._file.read(size)
+
+    def seek(self, offset, whence=0):
+        return self._file.seek(offset, whence)
+
+class _Limit:
+    """Concurrency limit that turns a long wait into 503 Busy; the wait is recorded as the `stage` span"""
+
+    def __init__(self, limit, timeout, stage):
+        self._semaphore = asyncio.Semaphore(limit)
+        self._timeout = timeout
+        self._stage = stage
+
+    async def __aenter__(self):
+        with telemetry.span(self._stage):
+            try:
+                await asyncio.wait_for(self._semaphore.acquire(), self._timeout)
+            except asyncio.TimeoutError:
+                raise web.HTTPServiceUnavailable(reason="Server busy, try again later")
+
+    async def __aexit__(self, *exc_info):
+        self._semaphore.release()
+
+async def _run(request, func, *args, **kwargs):
+    """Run a blocking call on the app's thread pool, in the request's context so spans join its trace"""
+    loop = asyncio.get_running_loop()
+    context = contextvars.copy_context()
+    return await loop.run_in_executor(request.app["executor"], lambda: context.run(func, *args, **kwargs))
+
+async def _iterate(request, iterator):
+    """Drive a blocking iterator from the thread pool, one item at a time"""
+    done = object()
+    while True:
+        item = await _run(request, next, iterator, done)
+        if item is done:
+            return
+        yield item
+
+def _namespace(request):
+    """Index namespace named by the ?namespace= query parameter"""
+    try:
+        return validate_namespace(request.query.get("namespace", DEFAULT_NAMESPACE))
+    except ValueError as e:
+        raise web.HTTPBadRequest(reason=str(e))
+
+def _session(sessions, key, factory):
+    """Get or create a session's state, forgetting the least recently used sessions first"""
+    state = sessions.pop(key, None)
+    if state is None:
+        state = factory()
+    sessions[key] = state
+    while len(sessions) > SERVER_MAX_SESSIONS:
+        sessions.popitem(last=False)
+    return state
+
+def _json_error(status, message):
+    return web.json_response({"error": message}, status=status)
+
+@web.middleware
+async def error_middleware(request, handler):
+    try:
+        return await handler(request)
+    except web.HTTPException as e:
+        if e.status < 400:
+            raise
+        return _json_error(e.status, e.reason)
+    except Exception as e:
+        logger.exception("%s %s failed", request.method, request.path)
+        return _json_error(500, str(e))
+
+async def health(request):
+    return web.json_response({"status": "ok"})
+
+async def documents(request):
+    return web.json_response(await _run(request, utils.get_index_summary, _namespace(request)))
+
+async def stats(request):
+    return web.json_response({"answer_cache": utils.get_answer_cache().stats(), "stages": telemetry.snapshot()})
+
+async def metrics(request):
+    return web.Response(text=telemetry.render_prometheus(), headers={"Content-Type": "text/plain; version=0.0.4; charset=utf-8"})
+
+async def ingest(request):
+    namespace = _namespace(request)
+    reader = await request.multipart()
+    uploads = []
+    try:
+        async for part in reader:
+            if part.name != "files":
+                continue
+            file = tempfile.TemporaryFile()
+            while True:
+                block = await part.read_chunk()
+                if not block:
+                    break
+                file.write(block)
+            uploads.append(_Upload(part.filename, file))
+        if not uploads:
+            raise web.HTTPBadRequest(reason="No files uploaded")
+        files = await _run(request, utils.spool_uploads, uploads)
+    finally:
+        for upload in uploads:
+            upload._file.close()
+    # Parsing, embedding and indexing run on the ingestion worker; poll /jobs/{id}
+    job = ingest_jobs.submit_job(files, request.app["api_key"], namespace)
+    return web.json_response(job, status=202)
+
+async def jobs(request):
+    return web.json_response(await _run(request, ingest_jobs.list_jobs, _namespace(request)))
+
+async def job(request):
+    found = await _run(request, ingest_jobs.load_job, request.match_info["job_id"])
+    if found is None:
+        raise web.HTTPNotFound(reason="No such job")
+    return web.json_response(found)
+
+async def cancel_job(request):
+    found = await _run(request, ingest_jobs.cancel_job, request.match_info["job_id"])
+    if found is None:
+        raise web.HTTPNotFound(reason="No such job")
+    return web.json_response(found)
+
+async def remove_document(request):
+    namespace = _namespace(request)
+    await _run(request, utils.remove_document_from_index, request.match_info["digest"], request.app["api_key"], namespace)
+    return web.json_response(await _run(request, utils.get_index_summary, namespace))
+
+async def clear_documents(request):
+    namespace = _namespace(request)
+    await _run(request, utils.clear_index, namespace)
+    return web.json_response(await _run(request, utils.get_index_summary, namespace))
+
+async def ask(request):
+    body = await request.json()
+    question = (body.get("question") or "").strip()
+    if not question:
+        raise web.HTTPBadRequest(reason="A question is required")
+    documents = body.get("documents")
+    if documents is not None and not (isinstance(documents, list) and all(isinstance(d, str) for d in documents)):
+        raise web.HTTPBadRequest(reason="documents must be a list of document digests")
+    namespace = _namespace(request)
+    if utils.get_index_version(namespace) is None:
+        raise web.HTTPConflict(reason="No documents have been processed")
+    api_key = request.app["api_key"]
+    # Follow-ups are only rewritten for clients that send a session id
+    session_id = body.get("session_id")
+    conversation = None
+    if session_id:
+        conversation = _session(request.app["conversations"], (str(session_id), namespace),
+                                lambda: Conversation(**conversation_from_env()))
+
+    started = time.perf_counter()
+    with telemetry.trace("ask", namespace=namespace) as trace:
+        async with request.app["ask_limit"]:
+            standalone_question = question
+            if conversation is not None:
+                standalone_question = await _run(request, conversation.condense, question, utils.get_chat_model(api_key))
+            prepared = await _run(request, prepare_answer, standalone_question, api_key, namespace, documents or None)
+            trace.set(cache_hit=prepared["cached"] is not None)
+            if prepared["cached"] is not None:
+                answer, sources = prepared["cached"]
+            else:
+                sources = prepared["context"]
+            sources = [doc.metadata for doc in sources]
+
+            if not body.get("stream", True):
+                if prepared["cached"] is None:
+                    answer = await _run(request, answer_with_chain, prepared["context"], standalone_question, api_key)
+                await _run(request, record_answer, prepared, standalone_question, answer, started)
+                if conversation is not None:
+                    conversation.add_turn(question, answer)
+                return web.json_response({
+                    "answer": answer,
+                    "cached": prepared["cached"] is not None,
+                    "sources": sources,
+                    "standalone_question": standalone_question,
+                })
+
+            # Sources are known before the first token, so they travel in a header
+            response = web.StreamResponse(headers={
+                "Content-Type": "text/plain; charset=utf-8",
+                "X-Sources": json.dumps(sources, default=str),
+            })
+            await response.prepare(request)
+            if prepared["cached"] is None:
+                parts = []
+                try:
+                    async for token in _iterate(request, utils.stream_answer(prepared["context"], standalone_question, api_key)):
+                        parts.append(token)
+                        await response.write(token.encode("utf-8"))
+                except Exception:
+                    # Fall back to the blocking chain if nothing was streamed yet
+                    if parts:
+                        raise
+                if not parts:
+                    parts.append(await _run(request, answer_with_chain, prepared["context"], standalone_question, api_key))
+                    await response.write(parts[0].encode("utf-8"))
+                answer = "".join(parts)
+            else:
+                await response.write(answer.encode("utf-8"))
+            await _run(request, record_answer, prepared, standalone_question, answer, started)
+            if conversation is not None:
+                conversation.add_turn(question, answer)
+            await response.write_eof()
+            return response
+
+async def quiz(request):
+    body = await request.json()
+    try:
+        num_questions = int(body.get("num_questions", 5))
+    except (TypeError, ValueError):
+        raise web.HTTPBadRequest(reason="num_questions must be an integer")
+    difficulty = body.get("difficulty", "Medium")
+    if not 1 <= num_questions <= 50:
+        raise web.HTTPBadRequest(reason="num_questions must be between 1 and 50")
+    # Each difficulty has its own question bank on disk
+    if difficulty not in DIFFICULTIES:
+        raise web.HTTPBadRequest(reason=f"difficulty must be one of {', '.join(DIFFICULTIES)}")
+    namespace = _namespace(request)
+    if utils.get_index_version(namespace) is None:
+        raise web.HTTPConflict(reason="No documents have been processed")
+
+    # Questions served to each session, least recently used sessions forgotten first;
+    # anonymous requests are not tracked, so they never share one another's history
+    session_id = body.get("session_id")
+    served_ids = _session(request.app["served_ids"], str(session_id), set) if session_id else set()
+
+    with telemetry.trace("quiz", requested=num_questions, difficulty=difficulty, namespace=namespace):
+        async with request.app["quiz_limit"]:
+            questions, answers, quiz_stats = await _run(
+                request, build_quiz, num_questions, difficulty, request.app["api_key"], served_ids, namespace=namespace
+            )
+    return web.json_response({"questions": questions, "answers": answers, "stats": quiz_stats})
+
+async def _resume_jobs(app):
+    ingest_jobs.resume_jobs(app["api_key"])
+
+async def _shutdown_executor(app):
+    app["executor"].shutdown(wait=False)
+
+def create_app():
+    """Build the aiohttp application (also the gunicorn entry point)"""
+    load_dotenv()
+    logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO"), format="%(asctime)s %(name)s %(levelname)s %(message)s")
+    api_key = os.getenv("GOOGLE_API_KEY")
+    if not api_key:
+        raise SystemExit("GOOGLE_API_KEY is not set")
+
+    timeout = _env_number("SERVER_QUEUE_TIMEOUT", SERVER_QUEUE_TIMEOUT)
+    app = web.Application(middlewares=[error_middleware], client_max_size=_env_number("SERVER_MAX_UPLOAD_MB", 200) * 1024 ** 2)
+    app["api_key"] = api_key
+    app["executor"] = ThreadPoolExecutor(max_workers=_env_number("SERVER_WORKER_THREADS", SERVER_WORKER_THREADS))
+    app["ask_limit"] = _Limit(_env_number("SERVER_MAX_ASKS", SERVER_MAX_ASKS), timeout, "ask.queue")
+    app["quiz_limit"] = _Limit(_env_number("SERVER_MAX_QUIZZES", SERVER_MAX_QUIZZES), timeout, "quiz.queue")
+    app["served_ids"] = OrderedDict()
+    app["conversations"] = OrderedDict()
+    app.on_startup.append(_resume_jobs)
+    app.on_cleanup.append(_shutdown_executor)
+    app.add_routes([
+        web.get("/health", health),
+        web.get("/documents", documents),
+        web.delete("/documents", clear_documents),
+        web.delete("/documents/{digest}", remove_document),
+        web.get("/stats", stats),
+        web.get("/metrics", metrics),
+        web.post("/ingest", ingest),
+        web.get("/jobs", jobs),
+        web.get("/jobs/{job_id}", job),
+        web.delete("/jobs/{job_id}", cancel_job),
+        web.post("/ask", ask),
+        web.post("/quiz", quiz),
+    ])
+    return app
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve the PDF assistant over HTTP")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    args = parser.parse_args()
+    web.run_app(create_app(), host=args.host, port=args.port)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+import gzip
+import json
+import math
+import os
+import re
+from collections import Counter
+
+SPARSE_INDEX_FILE = "bm25.json.gz"
+
+# Keeps part numbers, error codes and clause ids ("E-1234", "3.2.1") whole
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+(?:[-_./][a-z0-9]+)*")
+
+def tokenize(text):
+    """Lowercased terms, with compound identifiers emitted whole and split"""
+    tokens = []
+    for token in TOKEN_PATTERN.findall(text.lower()):
+        tokens.append(token)
+        parts = re.split(r"[-_./]", token)
+        if len(parts) > 1:
+            tokens += parts
+    return tokens
+
+class BM25Index:
+    """Okapi BM25 over chunks, stored as an inverted index of term -> (slot, tf) postings
+
+    Chunks are addressed by the same ids as the FAISS docstore. Removed chunks
+    leave an empty slot that is compacted away on save.
+    """
+
+    def __init__(self, k1=1.5, b=0.75):
+        self.k1 = k1
+        self.b = b
+        self.chunk_ids = []
+        self.lengths = []
+        self.postings = {}
+        self._slots = {}
+
+    @property
+    def size(self):
+        return len(self._slots)
+
+    def add(self, ids, texts):
+        """Index chunks under their docstore ids"""
+        for chunk_id, text in zip(ids, texts):
+            if chunk_id in self._slots:
+                continue
+            slot = len(self.chunk_ids)
+            terms = Counter(tokenize(text))
+            self._slots[chunk_id] = slot
+            self.chunk_ids.append(chunk_id)
+            self.lengths.append(sum(terms.values()))
+            for term, tf in terms.items():
+                self.postings.setdefault(term, {})[slot] = tf
+
+    def remove(self, ids):
+        """Drop chunks from the index"""
+        slots = {self._slots.pop(chunk_id) for chunk_id in ids if chunk_id in self._slots}
+        if not slots:
+            return
+        for slot in slots:
+            self.chunk_ids[slot] = None
+            self.lengths[slot] = 0
+        for term in list(self.postings):
+            posting = self.postings[term]
+            for slot in slots & posting.keys():
+                del posting[slot]
+            if not posting:
+                del self.postings[term]
+
+    def search(self, query, k=20, allowed=None):
+        """Return up to k (chunk_id, score) pairs, best first (all matches when k is None)
+
+        allowed, when given, is a predicate on chunk ids; other chunks are skipped.
+        """
+        if not self._slots:
+            return []
+        n = len(self._slots)
+        avg_length = sum(self.lengths) / n or 1.0
+        scores = Counter()
+        for term in set(tokenize(query)):
+            posting = self.postings.get(term)
+            if not posting:
+                continue
+            idf = math.log(1 + (n - len(posting) + 0.5) / (len(posting) + 0.5))
+            for slot, tf in posting.items():
+                norm = self.k1 * (1 - self.b + self.b * self.lengths[slot] / avg_length)
+                scores[slot] += idf * tf * (self.k1 + 1) / (tf + norm)
+        if allowed is not None:
+            scores = Counter({slot: score for slot, score in scores.items() if allowed(self.chunk_ids[slot])})
+        return [(self.chunk_ids[slot], score) for slot, score in scores.most_common(k)]
+
+    def save(self, directory):
+        """Write the index, compacted and gzipped, next to the FAISS files"""
+        live = [slot for slot, chunk_id in enumerate(self.chunk_ids) if chunk_id is not None]
+        renumber = {slot: i for i, slot in enumerate(live)}
+        data = {
+            "k1": self.k1,
+            "b": self.b,
+            "ids": [self.chunk_ids[slot] for slot in live],
+            "lengths": [self.lengths[slot] for slot in live],
+            # term -> flat [slot, tf, slot, tf, ...] list
+            "postings": {
+                term: [value for slot, tf in posting.items() for value in (renumber[slot], tf)]
+                for term, posting in self.postings.items()
+            },
+        }
+        path = os.path.join(directory, SPARSE_INDEX_FILE)
+        tmp_path = f"{path}.tmp"
+        with gzip.open(tmp_path, "wt", encoding="utf-8") as f:
+            json.dump(data, f, separators=(",", ":"))
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, directory):
+        """Load a saved index, or return None if the directory has none"""
+        path = os.path.join(directory, SPARSE_INDEX_FILE)
+        if not os.path.exists(path):
+            return None
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            data = json.load(f)
+        index = cls(k1=data["k1"], b=data["b"])
+        index.chunk_ids = data["ids"]
+        index.lengths = data["lengths"]
+        index._slots = {chunk_id: slot for slot, chunk_id in enumerate(index.chunk_ids)}
+        index.postings = {
+            term: dict(zip(flat[::2], flat[1::2])) for term, flat in data["postings"].items()
+        }
+        return index
+
+def reciprocal_rank_fusion(rankings, k=60):
+    """Fuse ranked id lists into one ranking by summing 1 / (k + rank)"""
+    scores = Counter()
+    for ranking in rankings:
+        for rank, chunk_id in enumerate(ranking, start=1):
+            scores[chunk_id] += 1.0 / (k + rank)
+    return [chunk_id for chunk_id, _ in scores.most_common()]
@@ -0,0 +1,193 @@
+import contextvars
+import json
+import logging
+import threading
+import time
+import uuid
+from collections import deque
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+METRIC_PREFIX = "pdf_assistant"
+
+# Upper bounds (seconds) of the Prometheus duration histogram buckets
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0)
+
+# Recent durations kept per stage for the percentiles in snapshot()
+RECENT_WINDOW = 512
+
+_current_trace = contextvars.ContextVar("current_trace", default=None)
+
+class Span:
+    """A timed stage; numeric attributes are summed per stage and cache_hit is counted"""
+
+    def __init__(self, name, attributes):
+        self.name = name
+        self.attributes = dict(attributes)
+        self.started = time.perf_counter()
+        self.stages = []
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+class _StageStats:
+    def __init__(self):
+        self.count = 0
+        self.errors = 0
+        self.seconds = 0.0
+        self.buckets = [0] * len(DURATION_BUCKETS)
+        self.recent = deque(maxlen=RECENT_WINDOW)
+        self.totals = {}
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+    def add(self, seconds, attributes, error):
+        self.count += 1
+        self.errors += error
+        self.seconds += seconds
+        for i, bound in enumerate(DURATION_BUCKETS):
+            if seconds <= bound:
+                self.buckets[i] += 1
+        self.recent.append(seconds)
+        for key, value in attributes.items():
+            if key == "cache_hit":
+                if value:
+                    self.cache_hits += 1
+                else:
+                    self.cache_misses += 1
+            elif isinstance(value, (int, float)) and not isinstance(value, bool):
+                self.totals[key] = self.totals.get(key, 0) + value
+
+_stages = {}
+_lock = threading.Lock()
+
+def record(name, seconds, error=False, **attributes):
+    """Record a stage whose duration was measured by the caller (e.g. accumulated over a stream)"""
+    with _lock:
+        _stages.setdefault(name, _StageStats()).add(seconds, attributes, error)
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.stages.append((name, seconds, attributes))
+    logger.debug(json.dumps({
+        "event": "span",
+        "span": name,
+        "trace": trace.attributes["trace_id"] if trace is not None else None,
+        "duration_ms": round(seconds * 1000, 2),
+        "error": error,
+        **attributes,
+    }, default=str))
+
+@contextmanager
+def span(name, **attributes):
+    """Time a stage of the current trace; call .set() on the yielded span to attach counts
+
+    Spans do not change the current trace, so they may wrap generators and
+    code that runs on other threads.
+    """
+    current = Span(name, attributes)
+    error = False
+    try:
+        yield current
+    except Exception:
+        error = True
+        raise
+    finally:
+        record(name, time.perf_counter() - current.started, error, **current.attributes)
+
+@contextmanager
+def trace(name, **attributes):
+    """Time a whole operation and log one structured line with the duration of each stage
+
+    Spans recorded inside the block (also on threads started with
+    contextvars.copy_context()) are listed in the trace's log line.
+    """
+    current = Span(name, attributes)
+    current.attributes["trace_id"] = uuid.uuid4().hex[:16]
+    token = _current_trace.set(current)
+    error = None
+    try:
+        yield current
+    except Exception as e:
+        error = e
+        raise
+    finally:
+        _current_trace.reset(token)
+        seconds = time.perf_counter() - current.started
+        trace_id = current.attributes.pop("trace_id")
+        with _lock:
+            _stages.setdefault(name, _StageStats()).add(seconds, current.attributes, error is not None)
+        stages = {}
+        for stage, stage_seconds, _ in current.stages:
+            stages[stage] = round(stages.get(stage, 0.0) + stage_seconds * 1000, 2)
+        logger.info(json.dumps({
+            "event": "trace",
+            "trace": trace_id,
+            "name": name,
+            "duration_ms": round(seconds * 1000, 2),
+            "error": str(error) if error is not None else None,
+            "stages_ms": stages,
+            **current.attributes,
+        }, default=str))
+
+def _percentile(values, q):
+    # Linear interpolation between closest ranks, like numpy.percentile
+    values = sorted(values)
+    position = (len(values) - 1) * q / 100
+    lower = int(position)
+    upper = min(lower + 1, len(values) - 1)
+    return values[lower] + (values[upper] - values[lower]) * (position - lower)
+
+def snapshot():
+    """Per-stage counts, latency percentiles over the recent window, cache hits and attribute totals"""
+    with _lock:
+        stages = {name: (stats.count, stats.errors, list(stats.recent), stats.cache_hits, stats.cache_misses, dict(stats.totals))
+                  for name, stats in _stages.items()}
+    result = {}
+    for name, (count, errors, recent, hits, misses, totals) in sorted(stages.items()):
+        result[name] = {
+            "count": count,
+            "errors": errors,
+            "p50_ms": round(_percentile(recent, 50) * 1000, 2),
+            "p95_ms": round(_percentile(recent, 95) * 1000, 2),
+            "last_ms": round(recent[-1] * 1000, 2),
+            "cache_hit_rate": hits / (hits + misses) if hits + misses else None,
+            "totals": totals,
+        }
+    return result
+
+def _labels(**labels):
+    return "{" + ",".join(f'{key}="{value}"' for key, value in labels.items()) + "}"
+
+def render_prometheus():
+    """All stage metrics in the Prometheus text exposition format"""
+    duration = f"{METRIC_PREFIX}_stage_duration_seconds"
+    lines = [
+        f"# HELP {duration} Time spent in each traced stage",
+        f"# TYPE {duration} histogram",
+    ]
+    with _lock:
+        stages = sorted(_stages.items())
+        for name, stats in stages:
+            for bound, count in zip(DURATION_BUCKETS, stats.buckets):
+                lines.append(f"{duration}_bucket{_labels(stage=name, le=bound)} {count}")
+            lines.append(f"{duration}_bucket{_labels(stage=name, le='+Inf')} {stats.count}")
+            lines.append(f"{duration}_sum{_labels(stage=name)} {stats.seconds:.6f}")
+            lines.append(f"{duration}_count{_labels(stage=name)} {stats.count}")
+
+        counters = [
+            ("errors_total", "Traced stages that raised an exception", lambda stats: [({}, stats.errors)]),
+            ("cache_hits_total", "Stages served from a cache",
+             lambda stats: [({}, stats.cache_hits)] if stats.cache_hits + stats.cache_misses else []),
+            ("cache_misses_total", "Stages that missed their cache",
+             lambda stats: [({}, stats.cache_misses)] if stats.cache_hits + stats.cache_misses else []),
+            ("units_total", "Tokens, chunks, pages and other counts processed by each stage",
+             lambda stats: [({"unit": unit}, value) for unit, value in sorted(stats.totals.items())]),
+        ]
+        for suffix, help_text, values in counters:
+            metric = f"{METRIC_PREFIX}_stage_{suffix}"
+            lines += [f"# HELP {metric} {help_text}", f"# TYPE {metric} counter"]
+            for name, stats in stages:
+                for labels, value in values(stats):
+                    lines.append(f"{metric}{_labels(stage=name, **labels)} {value}")
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,13 @@
+import os
+import sys
+
+import pytest
+
+# The modules live at the repository root rather than in a package
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    """Run in an empty directory, since indexes, caches and jobs live under relative paths"""
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
@@ -0,0 +1,50 @@
+from chunking import chunk_pages, count_tokens, is_heading
+
+HEADING = "SECTION 4 MAINTENANCE SCHEDULE"
+
+def test_chunks_under_a_heading_stay_within_budget():
+    # One long run-on "sentence" forces the word-split fallback
+    body = " ".join(f"word{i}" for i in range(400))
+    chunks = chunk_pages([(1, f"{HEADING}\n{body}")], max_tokens=60, overlap_tokens=20)
+
+    assert len(chunks) > 1
+    for chunk in chunks:
+        assert chunk["text"].startswith(HEADING + "\n")
+        assert count_tokens(chunk["text"]) <= 60
+
+def test_overlap_trim_never_drops_the_heading():
+    # Each sentence fits max_tokens on its own, but not together with the heading
+    sentence = "Sentence {} explains how the inlet valve, outlet valve and bypass valve of the pump are checked."
+    sentences = " ".join(sentence.format(i) for i in range(10))
+    assert count_tokens(sentence.format(0)) <= 34 < count_tokens(HEADING + " " + sentence.format(0))
+    chunks = chunk_pages([(3, f"{HEADING}\n{sentences}")], max_tokens=34, overlap_tokens=30)
+
+    assert len(chunks) > 1
+    for chunk in chunks:
+        assert chunk["text"].splitlines()[0] == HEADING
+        assert count_tokens(chunk["text"]) <= 34
+        assert chunk["page"] == 3
+
+def test_pages_never_share_a_chunk():
+    chunks = chunk_pages([(1, "Short first page."), (2, "Short second page."), (3, "")])
+    assert chunks == [{"text": "Short first page.", "page": 1}, {"text": "Short second page.", "page": 2}]
+
+def test_a_heading_starts_a_new_chunk():
+    text = "Intro paragraph.\n2.1 Installation\nMount the pump.\nCHAPTER 3\nWiring notes."
+    chunks = chunk_pages([(1, text)])
+    assert [chunk["text"] for chunk in chunks] == ["Intro paragraph.", "2.1 Installation\nMount the pump.", "CHAPTER 3\nWiring notes."]
+
+def test_consecutive_chunks_overlap():
+    paragraphs = "\n\n".join(f"Paragraph {i} covers step {i} of the procedure." for i in range(20))
+    chunks = chunk_pages([(1, paragraphs)], max_tokens=40, overlap_tokens=15)
+
+    assert len(chunks) > 1
+    for previous, chunk in zip(chunks, chunks[1:]):
+        assert chunk["text"].splitlines()[0] == previous["text"].splitlines()[-1]
+
+def test_heading_detection():
+    assert is_heading("Section 2.1 Scope")
+    assert is_heading("4) Safety")
+    assert is_heading("TROUBLESHOOTING")
+    assert not is_heading("The pump is installed in 3 steps.")
+    assert not is_heading("2 screws hold the cover in place and must be removed before the housing can be opened")
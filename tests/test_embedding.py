@@ -0,0 +1,72 @@
+import asyncio
+import os
+
+import pytest
+
+from embedding import CHECKPOINT_DIR, FakeEmbeddingBackend, RateLimitError, clear_checkpoint, embed_texts, embed_texts_async
+
+TEXTS = [f"chunk {i}" for i in range(10)]
+
+class FailingBackend(FakeEmbeddingBackend):
+    """Fails with a non-retryable error on one call"""
+
+    def __init__(self, fail_on, **kwargs):
+        super().__init__(**kwargs)
+        self.fail_on = fail_on
+
+    def embed_documents(self, texts):
+        if self.calls + 1 == self.fail_on:
+            self.calls += 1
+            raise RuntimeError("connection reset")
+        return super().embed_documents(texts)
+
+def test_texts_are_embedded_in_batches_and_in_order():
+    backend = FakeEmbeddingBackend(dimensions=8)
+    progress = []
+    vectors = embed_texts(TEXTS, backend, batch_size=3, on_progress=lambda done, total: progress.append((done, total)))
+
+    assert backend.calls == 4
+    assert vectors == [backend.embed_query(text) for text in TEXTS]
+    assert progress[-1] == (len(TEXTS), len(TEXTS))
+
+def test_rate_limited_batches_are_retried():
+    backend = FakeEmbeddingBackend(dimensions=8, fail_every=2)
+    vectors = embed_texts(TEXTS, backend, batch_size=3, base_delay=0.001)
+
+    assert backend.calls > 4
+    assert vectors == [backend.embed_query(text) for text in TEXTS]
+
+def test_retries_give_up_after_max_retries():
+    backend = FakeEmbeddingBackend(dimensions=8, fail_every=1)
+    with pytest.raises(RateLimitError):
+        embed_texts(TEXTS, backend, batch_size=10, max_retries=2, base_delay=0.001)
+    assert backend.calls == 3
+
+def test_other_errors_are_not_retried():
+    backend = FailingBackend(fail_on=1, dimensions=8)
+    with pytest.raises(RuntimeError):
+        embed_texts(TEXTS, backend, batch_size=10, base_delay=0.001)
+    assert backend.calls == 1
+
+def test_failed_run_resumes_from_its_checkpoints(workdir):
+    with pytest.raises(RuntimeError):
+        embed_texts(TEXTS, FailingBackend(fail_on=3, dimensions=8), batch_size=3, max_concurrency=1, checkpoint_key="doc")
+    saved = len(os.listdir(os.path.join(CHECKPOINT_DIR, "doc")))
+    assert saved >= 2
+
+    backend = FakeEmbeddingBackend(dimensions=8)
+    vectors = asyncio.run(embed_texts_async(TEXTS, backend, batch_size=3, checkpoint_key="doc"))
+    assert backend.calls == 4 - saved
+    assert vectors == [backend.embed_query(text) for text in TEXTS]
+
+    clear_checkpoint("doc")
+    assert not os.path.exists(os.path.join(CHECKPOINT_DIR, "doc"))
+
+def test_checkpoints_of_other_texts_are_ignored(workdir):
+    embed_texts(TEXTS, FakeEmbeddingBackend(dimensions=8), batch_size=5, checkpoint_key="doc")
+    changed = ["changed"] + TEXTS[1:]
+    backend = FakeEmbeddingBackend(dimensions=8)
+    vectors = embed_texts(changed, backend, batch_size=5, checkpoint_key="doc")
+
+    assert backend.calls == 1
+    assert vectors == [backend.embed_query(text) for text in changed]
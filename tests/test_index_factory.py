@@ -0,0 +1,38 @@
+import faiss
+import numpy as np
+
+from index_factory import apply_search_params, build_faiss_index, needs_retraining
+
+def _vectors(n, dimensions=16):
+    return np.random.default_rng(0).normal(size=(n, dimensions)).astype(np.float32)
+
+def test_ivf_index_is_retrained_once_it_outgrows_its_lists():
+    _, config = build_faiss_index(_vectors(600), {"type": "ivf_flat", "params": {}})
+    assert config["type"] == "ivf_flat"
+    assert not needs_retraining(config, 700)
+    assert needs_retraining(config, 20_600)
+
+def test_configured_nlist_is_not_retrained_forever():
+    _, config = build_faiss_index(_vectors(20_000), {"type": "ivf_flat", "params": {"nlist": 100}})
+    assert config["params"]["nlist"] == 100
+    assert not needs_retraining(config, 200_000, requested_nlist=100)
+
+def test_flat_and_hnsw_are_never_retrained():
+    assert not needs_retraining({"type": "flat", "params": {}}, 1_000_000)
+    assert not needs_retraining({"type": "hnsw", "params": {"m": 32}}, 1_000_000)
+
+def test_default_nprobe_has_a_floor():
+    _, config = build_faiss_index(_vectors(5_000), {"type": "ivf_flat", "params": {}})
+    nlist, nprobe = config["params"]["nlist"], config["params"]["nprobe"]
+    assert nprobe == max(8, nlist // 8)
+
+def test_search_overrides_from_env_apply_at_load(monkeypatch):
+    index, config = build_faiss_index(_vectors(5_000), {"type": "ivf_flat", "params": {}})
+    monkeypatch.setenv("FAISS_NPROBE", "21")
+    apply_search_params(index, config)
+    assert faiss.extract_index_ivf(index).nprobe == 21
+
+    index, config = build_faiss_index(_vectors(500), {"type": "hnsw", "params": {}})
+    monkeypatch.setenv("FAISS_EF_SEARCH", "150")
+    apply_search_params(index, config)
+    assert index.hnsw.efSearch == 150
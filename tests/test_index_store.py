@@ -0,0 +1,86 @@
+import os
+import threading
+
+import pytest
+
+import index_store
+from index_store import current_dir, current_version, list_namespaces, publish, remove_namespace, validate_namespace, writer_lock
+
+def _publish(namespace, content):
+    with publish(namespace) as directory:
+        with open(os.path.join(directory, "data.txt"), "w", encoding="utf-8") as f:
+            f.write(content)
+    return current_dir(namespace)
+
+def test_publish_makes_the_new_version_current(workdir):
+    assert current_dir("docs") is None
+    first = _publish("docs", "one")
+    second = _publish("docs", "two")
+
+    assert first != second
+    assert current_dir("docs") == second
+    with open(os.path.join(second, "data.txt"), encoding="utf-8") as f:
+        assert f.read() == "two"
+    assert list_namespaces() == ["docs"]
+
+def test_a_failed_publish_keeps_the_current_version(workdir):
+    published = _publish("docs", "one")
+    with pytest.raises(RuntimeError):
+        with publish("docs") as directory:
+            open(os.path.join(directory, "data.txt"), "w").close()
+            raise RuntimeError("build failed")
+
+    assert current_dir("docs") == published
+    versions = os.listdir(os.path.dirname(published))
+    assert not [name for name in versions if name.startswith(".staging")]
+
+def test_old_versions_are_pruned(workdir):
+    for i in range(index_store.KEEP_OLD_VERSIONS + 3):
+        published = _publish("docs", str(i))
+    versions = os.listdir(os.path.dirname(published))
+    assert len(versions) == index_store.KEEP_OLD_VERSIONS + 1
+    assert current_version("docs") in versions
+
+def test_remove_namespace(workdir):
+    _publish("docs", "one")
+    remove_namespace("docs")
+    assert current_dir("docs") is None
+    assert list_namespaces() == []
+
+def test_invalid_namespaces_are_rejected():
+    for namespace in ("", "../etc", ".hidden", "a/b", "x" * 65, None):
+        with pytest.raises(ValueError):
+            validate_namespace(namespace)
+
+def test_writer_lock_is_reentrant(workdir):
+    with writer_lock("docs"):
+        with writer_lock("docs"):
+            _publish("docs", "one")
+    assert current_dir("docs") is not None
+
+def test_writer_lock_excludes_other_writers(workdir):
+    acquired = threading.Event()
+
+    def writer():
+        with writer_lock("docs"):
+            acquired.set()
+
+    with writer_lock("docs"):
+        thread = threading.Thread(target=writer)
+        thread.start()
+        assert not acquired.wait(0.2)
+    assert acquired.wait(5)
+    thread.join()
+
+def test_writers_of_other_namespaces_do_not_wait(workdir):
+    acquired = threading.Event()
+
+    def writer():
+        with writer_lock("other"):
+            acquired.set()
+
+    with writer_lock("docs"):
+        thread = threading.Thread(target=writer)
+        thread.start()
+        assert acquired.wait(5)
+    thread.join()
@@ -0,0 +1,37 @@
+import json
+
+from quiz import iter_json_objects, parse_quiz_json
+
+ITEM = {"question": "What does E-1234 mean?", "options": ["A) Low pressure", "B) Overheating", "C) Leak", "D) No power"], "answer": "A"}
+
+def test_objects_are_found_in_fences_and_prose():
+    text = f"Here is your quiz:\n```json\n[{json.dumps(ITEM)}, {json.dumps(ITEM)}]\n```\nGood luck!"
+    assert [json.loads(source) for source in iter_json_objects(text)] == [ITEM, ITEM]
+
+def test_braces_inside_strings_do_not_split_objects():
+    item = {**ITEM, "question": "Which value is in {braces} and \"quotes\"?"}
+    assert [json.loads(source) for source in iter_json_objects(json.dumps(item))] == [item]
+
+def test_a_truncated_tail_is_skipped():
+    text = json.dumps(ITEM) + ', {"question": "Unfinished'
+    assert len(list(iter_json_objects(text))) == 1
+
+def test_parse_normalises_valid_items_and_counts_malformed_ones():
+    malformed = [
+        {**ITEM, "options": ITEM["options"][:3]},
+        {**ITEM, "answer": 4},
+        {**ITEM, "answer": True},
+        {**ITEM, "options": ["Same", "Same", "Other", "Another"]},
+        {"options": ITEM["options"], "answer": 0},
+    ]
+    text = json.dumps([ITEM, {**ITEM, "answer": 2}] + malformed) + ' {"question": not json}'
+    parsed, invalid = parse_quiz_json(text)
+
+    assert parsed == [
+        ({"question": "What does E-1234 mean?", "options": ["Low pressure", "Overheating", "Leak", "No power"]}, 0),
+        ({"question": "What does E-1234 mean?", "options": ["Low pressure", "Overheating", "Leak", "No power"]}, 2),
+    ]
+    assert invalid == len(malformed) + 1
+
+def test_parse_of_a_reply_without_json():
+    assert parse_quiz_json("Sorry, I cannot help with that.") == ([], 0)
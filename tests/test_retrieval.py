@@ -0,0 +1,74 @@
+from collections import Counter
+
+import pytest
+from langchain_community.vectorstores import FAISS
+
+import utils
+from embedding import HashingEmbeddings
+from sparse_index import BM25Index
+
+SMALL_TOPICS = ("valve seals", "filter housing", "motor bearings", "control panel", "drain hose")
+
+def _corpus():
+    texts, metadatas, ids = [], [], []
+    # One large manual about the pump, and five short ones that also mention it
+    for i in range(500):
+        texts.append(f"The pump pressure reading {i} must stay inside the pump pressure range during step {i}.")
+        metadatas.append({"doc_id": "big", "source": "big.pdf", "page": i // 10 + 1})
+        ids.append(f"big-{i}")
+    for n, topic in enumerate(SMALL_TOPICS):
+        for i in range(5):
+            texts.append(f"Check the {topic} before raising the pump pressure, item {i}.")
+            metadatas.append({"doc_id": f"small-{n}", "source": f"small-{n}.pdf", "page": i + 1})
+            ids.append(f"small-{n}-{i}")
+    return texts, metadatas, ids
+
+@pytest.fixture
+def store(workdir, monkeypatch):
+    texts, metadatas, ids = _corpus()
+    embeddings = HashingEmbeddings(dimensions=256)
+    vector_store = FAISS.from_texts(texts, embeddings, metadatas=metadatas, ids=ids)
+    sparse_index = BM25Index()
+    sparse_index.add(ids, texts)
+    monkeypatch.setattr(utils, "load_sparse_index", lambda namespace=utils.DEFAULT_NAMESPACE: sparse_index)
+    return vector_store, embeddings
+
+def test_dominant_document_does_not_crowd_out_the_rest(store):
+    vector_store, embeddings = store
+    question = "pump pressure"
+    docs = utils.hybrid_search(vector_store, question, embeddings.embed_query(question))
+
+    documents = Counter(doc.metadata["doc_id"] for doc in docs)
+    assert len(docs) == utils.RETRIEVAL_TOP_K
+    assert documents["big"] < len(docs)
+    assert any(digest.startswith("small-") for digest in documents)
+
+def test_dense_candidates_respect_the_per_document_quota(store, monkeypatch):
+    vector_store, embeddings = store
+    monkeypatch.setattr(utils, "load_sparse_index", lambda namespace=utils.DEFAULT_NAMESPACE: None)
+    question = "pump pressure"
+    docs = utils.hybrid_search(vector_store, question, embeddings.embed_query(question), k=utils.RETRIEVAL_FETCH_K)
+
+    documents = Counter(doc.metadata["doc_id"] for doc in docs)
+    assert documents["big"] == utils.RETRIEVAL_MIN_PER_DOCUMENT
+    assert set(documents) == {"big"} | {f"small-{n}" for n in range(len(SMALL_TOPICS))}
+
+def test_documents_filter_restricts_both_retrievers(store):
+    vector_store, embeddings = store
+    question = "pump pressure"
+    docs = utils.hybrid_search(vector_store, question, embeddings.embed_query(question), documents=["small-2"])
+
+    assert docs
+    assert {doc.metadata["doc_id"] for doc in docs} == {"small-2"}
+
+def test_unknown_documents_return_nothing(store):
+    vector_store, embeddings = store
+    assert utils.hybrid_search(vector_store, "pump", embeddings.embed_query("pump"), documents=["missing"]) == []
+
+def test_quiz_sample_covers_distinct_chunks(store, monkeypatch):
+    vector_store, _ = store
+    monkeypatch.setattr(utils, "QUIZ_SAMPLE_PER_CHUNK", 20)
+    docs = utils.sample_diverse_chunks(vector_store, 8, seed=0)
+
+    assert len(docs) == 8
+    assert len({doc.page_content for doc in docs}) == 8
@@ -0,0 +1,33 @@
+import asyncio
+
+from aiohttp.test_utils import TestClient, TestServer
+
+import server
+import utils
+
+def _quiz_requests(bodies):
+    async def run():
+        app = server.create_app()
+        async with TestClient(TestServer(app)) as client:
+            for body in bodies:
+                response = await client.post("/quiz", json=body)
+                assert response.status == 200
+        return app
+    return asyncio.run(run())
+
+def test_quiz_tracks_served_questions_per_session_only(workdir, monkeypatch):
+    seen = []
+
+    def build_quiz(num_questions, difficulty, api_key, served_ids, namespace):
+        # Every question served so far, then one more
+        seen.append(set(served_ids))
+        served_ids.add(f"q{len(seen)}")
+        return [], [], {}
+
+    monkeypatch.setenv("GOOGLE_API_KEY", "test")
+    monkeypatch.setattr(server, "build_quiz", build_quiz)
+    monkeypatch.setattr(utils, "get_index_version", lambda namespace: "v1")
+    app = _quiz_requests([{}, {"session_id": ""}, {"session_id": "a"}, {"session_id": "a"}, {}, {"session_id": "b"}])
+
+    assert seen == [set(), set(), set(), {"q3"}, set(), set()]
+    assert list(app["served_ids"]) == ["a", "b"]
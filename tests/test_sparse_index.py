@@ -0,0 +1,54 @@
+from sparse_index import BM25Index, reciprocal_rank_fusion, tokenize
+
+IDS = ["a:0", "a:1", "b:0", "b:1"]
+TEXTS = [
+    "Replace the filter cartridge every six months.",
+    "Error E-1234 means the pump lost pressure.",
+    "The filter housing is sealed with an O-ring.",
+    "Check clause 3.2.1 before servicing the motor.",
+]
+
+def _index():
+    index = BM25Index()
+    index.add(IDS, TEXTS)
+    return index
+
+def test_compound_identifiers_are_kept_whole_and_split():
+    assert tokenize("Error E-1234") == ["error", "e-1234", "e", "1234"]
+
+def test_search_ranks_matching_chunks():
+    results = _index().search("filter cartridge")
+    assert [chunk_id for chunk_id, _ in results] == ["a:0", "b:0"]
+    assert _index().search("E-1234")[0][0] == "a:1"
+
+def test_allowed_predicate_filters_results():
+    results = _index().search("filter", allowed=lambda chunk_id: chunk_id.startswith("b:"))
+    assert [chunk_id for chunk_id, _ in results] == ["b:0"]
+
+def test_removed_chunks_are_no_longer_found():
+    index = _index()
+    index.remove(["a:0"])
+    assert index.size == 3
+    assert [chunk_id for chunk_id, _ in index.search("filter")] == ["b:0"]
+
+def test_save_and_load_round_trip(tmp_path):
+    index = _index()
+    index.remove(["a:1"])
+    index.add(["c:0"], ["A spare filter ships with the pump."])
+    index.save(tmp_path)
+    loaded = BM25Index.load(tmp_path)
+
+    assert loaded.size == index.size == 4
+    for query in ("filter", "pump", "E-1234", "clause 3.2.1"):
+        assert loaded.search(query) == index.search(query)
+
+    # A loaded index keeps accepting changes
+    loaded.add(["d:0"], ["Filter wrench"])
+    loaded.remove(["b:0"])
+    assert {chunk_id for chunk_id, _ in loaded.search("filter")} == {"a:0", "c:0", "d:0"}
+
+def test_load_without_an_index_returns_none(tmp_path):
+    assert BM25Index.load(tmp_path) is None
+
+def test_reciprocal_rank_fusion_favours_chunks_ranked_by_both():
+    assert reciprocal_rank_fusion([["x", "y", "z"], ["y", "w"]])[0] == "y"
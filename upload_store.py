@@ -0,0 +1,48 @@
+import hashlib
+import mmap
+import os
+from contextlib import contextmanager
+
+STORE_DIR = "uploads"
+
+# Bytes copied per read when spooling an upload to disk
+SPOOL_BLOCK_SIZE = 1 << 20
+
+def pdf_path(digest):
+    """Path of a stored PDF"""
+    return os.path.join(STORE_DIR, f"{digest}.pdf")
+
+def store_upload(upload):
+    """Spool an uploaded file to the content-addressed store and return its SHA-256
+
+    The upload is copied in blocks while it is hashed, so it is never joined
+    into a second in-memory buffer.
+    """
+    os.makedirs(STORE_DIR, exist_ok=True)
+    digest = hashlib.sha256()
+    tmp_path = os.path.join(STORE_DIR, f"upload-{os.getpid()}-{id(upload)}.tmp")
+    upload.seek(0)
+    with open(tmp_path, "wb") as f:
+        while True:
+            block = upload.read(SPOOL_BLOCK_SIZE)
+            if not block:
+                break
+            digest.update(block)
+            f.write(block)
+    upload.seek(0)
+    digest = digest.hexdigest()
+    if os.path.exists(pdf_path(digest)):
+        os.remove(tmp_path)
+    else:
+        os.replace(tmp_path, pdf_path(digest))
+    return digest
+
+@contextmanager
+def open_mapped(path):
+    """Memory-map a stored file read-only; the mmap is seekable like a file"""
+    with open(path, "rb") as f:
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            yield mapped
+        finally:
+            mapped.close()
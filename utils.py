@@ -1,58 +1,620 @@
 import streamlit as st
-from PyPDF2 import PdfReader
-from langchain.text_splitter import RecursiveCharacterTextSplitter
+import logging
 import os
-from langchain_google_genai import GoogleGenerativeAIEmbeddings
-import google.generativeai as genai
-from langchain_community.vectorstores import FAISS
-from langchain_google_genai import ChatGoogleGenerativeAI
-from langchain.chains.question_answering import load_qa_chain
-from langchain.prompts import PromptTemplate
 from dotenv import load_dotenv
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import importlib
+import json
+import threading
+import uuid
+import weakref
+from ingest_cache import load_cached_chunks, load_cached_document, save_cached_document
+from upload_store import open_mapped, pdf_path, store_upload
+from sparse_index import BM25Index, reciprocal_rank_fusion
+from chunking import chunk_pages, count_tokens
+from embedding_providers import DEFAULT_EMBEDDING_PROVIDER
+from index_store import DEFAULT_NAMESPACE, current_dir, current_version, publish, remove_namespace, validate_namespace, writer_lock
+import telemetry
+import random
 import time
 
+# LangChain, Gemini, FAISS, NumPy and PyPDF2 are imported inside the functions
+# that use them, so the first page renders without loading them; warm_up()
+# loads them in the background once the page is up.
+WARMUP_MODULES = (
+    "numpy",
+    "faiss",
+    "PyPDF2",
+    "langchain_core.documents",
+    "langchain_community.docstore.in_memory",
+    "langchain_community.vectorstores",
+    "langchain.prompts",
+    "langchain.chains.question_answering",
+    "langchain_google_genai",
+    "embedding",
+    "index_factory",
+    "answer_cache",
+    "context_budget",
+)
+
+logger = logging.getLogger(__name__)
+
+# Pages handed to a single worker process at a time
+PAGES_PER_TASK = 16
+
+MANIFEST_FILE = "manifest.json"
+
+# Loaded indexes kept in memory, across namespaces and versions
+LOADED_INDEX_CACHE_SIZE = 8
+
+# Serialises index writes between ingestion workers and removals
+_index_lock = threading.RLock()
+
+# Candidates taken from each retriever before fusion, and chunks passed to the chain
+RETRIEVAL_FETCH_K = 20
+# Candidates handed to the context budget, which trims them to fit the prompt
+RETRIEVAL_TOP_K = 6
+# Each document may contribute at most max(this, fetch_k / documents) candidates per retriever
+RETRIEVAL_MIN_PER_DOCUMENT = 4
+# Threads searching the documents of a query in parallel (FAISS releases the GIL)
+RETRIEVAL_WORKERS = 8
+# Vectors clustered per quiz chunk when sampling chunks for a quiz
+QUIZ_SAMPLE_PER_CHUNK = 256
+
+_search_executor = ThreadPoolExecutor(max_workers=RETRIEVAL_WORKERS, thread_name_prefix="search")
+
+# Document -> FAISS positions of each loaded index, dropped together with the index
+_document_positions = weakref.WeakKeyDictionary()
+_positions_lock = threading.Lock()
+
 def setup_environment():
     """Load environment variables and configure Google API"""
     load_dotenv()
+    logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO"), format="%(asctime)s %(name)s %(levelname)s %(message)s")
     api_key = os.getenv("GOOGLE_API_KEY")
     if not api_key:
         st.error("Google API key not found. Please add it to your .env file.")
         st.stop()
     
-    genai.configure(api_key=api_key)
+    # Gemini clients are given the key directly; google.generativeai is configured during warm-up
     return api_key
 
-def get_pdf_text(pdf_docs):
-    """Extract text from PDF documents"""
-    text = ""
-    for pdf in pdf_docs:
-        pdf_reader = PdfReader(pdf)
-        for page in pdf_reader.pages:
-            text += page.extract_text()
-    return text
-
-def get_text_chunks(text, chunk_size=10000, chunk_overlap=200):
-    """Split text into manageable chunks"""
-    text_splitter = RecursiveCharacterTextSplitter(
-        chunk_size=chunk_size,
-        chunk_overlap=chunk_overlap,
-        length_function=len
-    )
-    chunks = text_splitter.split_text(text)
-    return chunks
+_warm_up_started = False
+_warm_up_lock = threading.Lock()
 
-def get_vector_store(chunks, api_key):
-    """Create vector embeddings and store in FAISS index"""
-    embeddings = GoogleGenerativeAIEmbeddings(
-        model="models/embedding-001", 
-        google_api_key=api_key
+def _warm_up(api_key, namespace):
+    started = time.perf_counter()
+    for module in WARMUP_MODULES:
+        try:
+            importlib.import_module(module)
+        except ImportError as e:
+            logger.warning("Warm-up could not import %s: %s", module, e)
+    try:
+        import google.generativeai as genai
+        genai.configure(api_key=api_key)
+        # Build the shared clients and load the corpus the page was opened on
+        get_chat_model(api_key)
+        if current_version(namespace) is not None:
+            load_vector_store(api_key, namespace)
+            load_sparse_index(namespace)
+    except Exception:
+        logger.warning("Warm-up failed", exc_info=True)
+    logger.info("Warm-up finished in %.0f ms", (time.perf_counter() - started) * 1000)
+
+def warm_up(api_key, namespace=DEFAULT_NAMESPACE):
+    """Import the heavy dependencies and load the namespace's index in a background thread (once per process)
+
+    Call this after the page has been drawn, so the first paint does not
+    wait for it and the first question usually does not either. Nothing is
+    loaded when the app talks to a serving API.
+    """
+    global _warm_up_started
+    if get_api_client() is not None:
+        return
+    with _warm_up_lock:
+        if _warm_up_started:
+            return
+        _warm_up_started = True
+    threading.Thread(target=_warm_up, args=(api_key, namespace), name="warm-up", daemon=True).start()
+
+def _resolve_pdf(pdf, position):
+    """Return (name, path) for an on-disk PDF, spooling uploads to the store first"""
+    if isinstance(pdf, (str, os.PathLike)):
+        return os.path.basename(pdf), os.fspath(pdf)
+    name = getattr(pdf, "name", None) or f"document-{position + 1}"
+    return name, pdf_path(store_upload(pdf))
+
+def _count_pages(path):
+    from PyPDF2 import PdfReader
+    with open_mapped(path) as mapped:
+        return len(PdfReader(mapped).pages)
+
+def _extract_page_range(path, start, stop):
+    """Extract text for pages [start, stop) of a PDF (runs in a worker process)"""
+    from PyPDF2 import PdfReader
+    with open_mapped(path) as mapped:
+        pdf_reader = PdfReader(mapped)
+        return [pdf_reader.pages[i].extract_text() or "" for i in range(start, stop)]
+
+def iter_pdf_pages(pdf_docs, max_workers=None, on_progress=None):
+    """Yield (file, page_no, text) for every page, in order, extracting in a process pool
+
+    Uploads are spooled to the content-addressed store and workers read them
+    through mmap, so PDF bytes are never pickled across processes.
+    on_progress(pages_done, total_pages, pages_per_sec) is called after each batch.
+    """
+    # Split every document into page ranges
+    tasks = []
+    for i, pdf in enumerate(pdf_docs):
+        name, path = _resolve_pdf(pdf, i)
+        page_count = _count_pages(path)
+        for start in range(0, page_count, PAGES_PER_TASK):
+            tasks.append((name, path, start, min(start + PAGES_PER_TASK, page_count)))
+
+    total_pages = sum(stop - start for _, _, start, stop in tasks)
+    pages_done = 0
+    started = time.perf_counter()
+
+    def report(count):
+        nonlocal pages_done
+        pages_done += count
+        if on_progress:
+            elapsed = max(time.perf_counter() - started, 1e-6)
+            on_progress(pages_done, total_pages, pages_done / elapsed)
+
+    # Small uploads are not worth the cost of starting worker processes
+    if len(tasks) <= 1:
+        for name, path, start, stop in tasks:
+            texts = _extract_page_range(path, start, stop)
+            report(len(texts))
+            for offset, text in enumerate(texts):
+                yield name, start + offset + 1, text
+        return
+
+    workers = min(max_workers or os.cpu_count() or 1, len(tasks))
+    executor = ProcessPoolExecutor(max_workers=workers)
+    try:
+        futures = [executor.submit(_extract_page_range, path, start, stop) for _, path, start, stop in tasks]
+        # Consume in submission order so pages come out in document order
+        for (name, _, start, _), future in zip(tasks, futures):
+            texts = future.result()
+            report(len(texts))
+            for offset, text in enumerate(texts):
+                yield name, start + offset + 1, text
+    finally:
+        # Drop pending page ranges when the caller stops early (e.g. a cancelled job)
+        executor.shutdown(wait=True, cancel_futures=True)
+
+def get_embedding_provider(namespace=DEFAULT_NAMESPACE):
+    """Return the embedding provider of a namespace's index, or the configured one for a new index
+
+    The provider that built the index is recorded in its manifest, so queries
+    and later uploads always use the same model.
+    """
+    return load_index_manifest(namespace).get("embedding_provider") or os.getenv("EMBEDDING_PROVIDER", DEFAULT_EMBEDDING_PROVIDER)
+
+@st.cache_resource(show_spinner=False)
+def _get_embeddings(api_key, provider):
+    from embedding import create_embeddings
+    return create_embeddings(provider, api_key)
+
+def get_embeddings(api_key, provider=None, namespace=DEFAULT_NAMESPACE):
+    """Return the embeddings client used for documents and queries (shared per process)"""
+    return _get_embeddings(api_key, provider or get_embedding_provider(namespace))
+
+def get_vector_store(chunks, api_key, vectors=None, ids=None, metadatas=None, provider=None, index_config=None, directory=None):
+    """Create vector embeddings and store in FAISS index
+
+    Precomputed vectors (e.g. from the ingestion cache) are used as-is. The
+    FAISS index type comes from index_config (default: FAISS_* environment
+    variables). The index is saved to directory when one is given. Returns
+    the vector store and the effective index config.
+    """
+    import numpy as np
+    from langchain_community.docstore.in_memory import InMemoryDocstore
+    from langchain_community.vectorstores import FAISS
+    from langchain_core.documents import Document
+    from embedding import embed_texts
+    from index_factory import build_faiss_index, index_config_from_env
+    
+    embeddings = get_embeddings(api_key, provider)
+    if vectors is None:
+        vectors = embed_texts(chunks, embeddings)
+    ids = ids or [str(i) for i in range(len(chunks))]
+    metadatas = metadatas or [{} for _ in chunks]
+    index, index_config = build_faiss_index(np.asarray(vectors, dtype=np.float32), index_config or index_config_from_env())
+    docstore = InMemoryDocstore({
+        chunk_id: Document(page_content=chunk, metadata=metadata)
+        for chunk_id, chunk, metadata in zip(ids, chunks, metadatas)
+    })
+    vector_store = FAISS(embeddings, index, docstore, dict(enumerate(ids)))
+    if directory is not None:
+        vector_store.save_local(directory)
+    return vector_store, index_config
+
+def load_index_manifest(namespace=DEFAULT_NAMESPACE, directory=None):
+    """Return the per-document chunk ranges recorded for a namespace's published index (or an index directory)"""
+    directory = directory or current_dir(namespace)
+    path = os.path.join(directory, MANIFEST_FILE) if directory else None
+    if path is None or not os.path.exists(path):
+        return {"documents": {}}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+def save_index_manifest(manifest, directory):
+    """Write the index manifest next to the FAISS files"""
+    path = os.path.join(directory, MANIFEST_FILE)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f)
+    os.replace(tmp_path, path)
+
+def document_chunk_ids(digest, count):
+    """Return the docstore ids of a document's chunks"""
+    return [f"{digest}:{i}" for i in range(count)]
+
+def _document_rows(digest, entry):
+    chunk_ids = document_chunk_ids(digest, len(entry["chunks"]))
+    return chunk_ids, [{"doc_id": digest, "source": entry["name"], "page": page} for page in entry["pages"]]
+
+def _rebuild_index(manifest, provider, api_key, index_config, directory):
+    """Build the FAISS and BM25 indexes for the manifest's documents from the ingestion cache into directory"""
+    chunks, vectors, ids, metadatas = [], [], [], []
+    for digest in manifest["documents"]:
+        entry = load_cached_document(digest, provider)
+        if entry is None:
+            raise FileNotFoundError(f"Cached embeddings for {manifest['documents'][digest]['name']} are missing; re-upload it.")
+        chunk_ids, chunk_metadatas = _document_rows(digest, entry)
+        chunks += entry["chunks"]
+        vectors += entry["embeddings"]
+        ids += chunk_ids
+        metadatas += chunk_metadatas
+    _, manifest["index"] = get_vector_store(
+        chunks, api_key, vectors=vectors, ids=ids, metadatas=metadatas,
+        provider=provider, index_config=index_config, directory=directory
     )
-    vector_store = FAISS.from_texts(chunks, embeddings)
-    vector_store.save_local("faiss_index")
+    sparse_index = BM25Index()
+    sparse_index.add(ids, chunks)
+    sparse_index.save(directory)
+
+def add_documents_to_index(documents, api_key, provider=None, namespace=DEFAULT_NAMESPACE):
+    """Append documents (hash -> cache entry) that are not yet in a namespace's FAISS index
+
+    The updated index is written as a new version and published atomically.
+    """
+    from langchain_community.vectorstores import FAISS
+    from index_factory import index_config_from_env, needs_retraining
+    
+    with _index_lock, writer_lock(namespace):
+        manifest = load_index_manifest(namespace)
+        provider = provider or get_embedding_provider(namespace)
+        if manifest["documents"] and manifest.get("embedding_provider", DEFAULT_EMBEDDING_PROVIDER) != provider:
+            raise ValueError(
+                f"The index was built with the {manifest.get('embedding_provider', DEFAULT_EMBEDDING_PROVIDER)} "
+                f"embedding provider and cannot be extended with {provider} vectors."
+            )
+        new_documents = {
+            digest: entry for digest, entry in documents.items()
+            if digest not in manifest["documents"] and entry["chunks"]
+        }
+        if not new_documents:
+            return 0
+
+        chunks, vectors, ids, metadatas = [], [], [], []
+        for digest, entry in new_documents.items():
+            chunk_ids, chunk_metadatas = _document_rows(digest, entry)
+            chunks += entry["chunks"]
+            vectors += entry["embeddings"]
+            ids += chunk_ids
+            metadatas += chunk_metadatas
+
+        index_config = index_config_from_env()
+        current_config = manifest.get("index", {"type": "flat", "params": {}})
+        manifest["embedding_provider"] = provider
+        for digest, entry in new_documents.items():
+            manifest["documents"][digest] = {"name": entry["name"], "count": len(entry["chunks"])}
+
+        published = current_dir(namespace)
+        total_chunks = sum(document["count"] for document in manifest["documents"].values())
+        with publish(namespace) as directory:
+            if (len(manifest["documents"]) > len(new_documents) and published and current_config["type"] == index_config["type"]
+                    and not needs_retraining(current_config, total_chunks, index_config["params"].get("nlist"))):
+                # Merge the new vectors into the existing (already trained) index
+                vector_store = FAISS.load_local(published, get_embeddings(api_key, provider), allow_dangerous_deserialization=True)
+                vector_store.add_embeddings(list(zip(chunks, vectors)), metadatas=metadatas, ids=ids)
+                vector_store.save_local(directory)
+
+                # Keep the BM25 index in step with the vector index
+                sparse_index = BM25Index.load(published) or BM25Index()
+                sparse_index.add(ids, chunks)
+                sparse_index.save(directory)
+            else:
+                # New index, the configured index type changed (e.g. the corpus is now
+                # large enough to train IVF), or an IVF index outgrew its trained lists:
+                # build over every document
+                _rebuild_index(manifest, provider, api_key, index_config, directory)
+            save_index_manifest(manifest, directory)
+        return len(chunks)
+
+def remove_document_from_index(digest, api_key, namespace=DEFAULT_NAMESPACE):
+    """Delete a single document's chunks from a namespace's FAISS index"""
+    from langchain_community.vectorstores import FAISS
+    from index_factory import supports_remove
+    
+    with _index_lock, writer_lock(namespace):
+        manifest = load_index_manifest(namespace)
+        document = manifest["documents"].pop(digest, None)
+        if document is None:
+            return
+
+        if not manifest["documents"]:
+            # Nothing left to serve, drop the index entirely
+            remove_namespace(namespace)
+            return
+
+        published = current_dir(namespace)
+        index_config = manifest.get("index", {"type": "flat", "params": {}})
+        with publish(namespace) as directory:
+            if not supports_remove(index_config):
+                # IVF and HNSW indexes cannot drop vectors in place
+                _rebuild_index(manifest, manifest.get("embedding_provider", DEFAULT_EMBEDDING_PROVIDER), api_key, index_config, directory)
+            else:
+                vector_store = FAISS.load_local(published, get_embeddings(api_key, namespace=namespace), allow_dangerous_deserialization=True)
+                chunk_ids = document_chunk_ids(digest, document["count"])
+                vector_store.delete(chunk_ids)
+                vector_store.save_local(directory)
+                sparse_index = BM25Index.load(published)
+                if sparse_index is not None:
+                    sparse_index.remove(chunk_ids)
+                    sparse_index.save(directory)
+            save_index_manifest(manifest, directory)
+
+def get_index_version(namespace=DEFAULT_NAMESPACE):
+    """Return a token that changes whenever a namespace's index is republished"""
+    version = current_version(namespace)
+    if version is None:
+        return None
+    return f"{namespace}/{version}"
+
+@st.cache_resource(show_spinner=False, max_entries=LOADED_INDEX_CACHE_SIZE)
+def _load_vector_store(api_key, directory):
+    from langchain_community.vectorstores import FAISS
+    from index_factory import apply_search_params
+    manifest = load_index_manifest(directory=directory)
+    embeddings = get_embeddings(api_key, manifest.get("embedding_provider", DEFAULT_EMBEDDING_PROVIDER))
+    vector_store = FAISS.load_local(directory, embeddings, allow_dangerous_deserialization=True)
+    apply_search_params(vector_store.index, manifest.get("index", {"type": "flat", "params": {}}))
     return vector_store
 
-def get_conversational_chain(api_key):
-    """Create a conversational chain for question answering"""
+def load_vector_store(api_key, namespace=DEFAULT_NAMESPACE):
+    """Return a namespace's FAISS index shared across sessions
+
+    Loaded indexes live in a bounded LRU keyed by published version, so many
+    corpora are served from memory and a namespace reloads only after it is
+    republished.
+    """
+    directory = current_dir(namespace)
+    if directory is None:
+        raise FileNotFoundError("No documents have been indexed yet.")
+    return _load_vector_store(api_key, directory)
+
+@st.cache_resource(show_spinner=False, max_entries=LOADED_INDEX_CACHE_SIZE)
+def _load_sparse_index(directory):
+    return BM25Index.load(directory)
+
+def load_sparse_index(namespace=DEFAULT_NAMESPACE):
+    """Return a namespace's BM25 index shared across sessions, or None for indexes built without one"""
+    directory = current_dir(namespace)
+    if directory is None:
+        return None
+    return _load_sparse_index(directory)
+
+def get_document_positions(vector_store):
+    """Return ({digest: FAISS positions}, {chunk id: digest}) for a loaded index, computed once per index"""
+    with _positions_lock:
+        found = _document_positions.get(vector_store)
+    if found is None:
+        import numpy as np
+        positions, chunk_documents = {}, {}
+        for position, chunk_id in vector_store.index_to_docstore_id.items():
+            digest = getattr(vector_store.docstore.search(chunk_id), "metadata", {}).get("doc_id")
+            positions.setdefault(digest, []).append(position)
+            chunk_documents[chunk_id] = digest
+        found = ({digest: np.asarray(ids, dtype=np.int64) for digest, ids in positions.items()}, chunk_documents)
+        with _positions_lock:
+            _document_positions[vector_store] = found
+    return found
+
+def _take_per_document(chunk_ids, chunk_documents, per_document_k, fetch_k):
+    # Keep ranking order, skipping chunks of documents that already filled their quota
+    taken = Counter()
+    kept = []
+    for chunk_id in chunk_ids:
+        digest = chunk_documents.get(chunk_id)
+        if taken[digest] < per_document_k:
+            taken[digest] += 1
+            kept.append(chunk_id)
+            if len(kept) == fetch_k:
+                break
+    return kept
+
+def hybrid_search(vector_store, question, question_vector, k=RETRIEVAL_TOP_K, fetch_k=RETRIEVAL_FETCH_K,
+                  namespace=DEFAULT_NAMESPACE, documents=None):
+    """Retrieve chunks by fusing dense (FAISS) and sparse (BM25) rankings with reciprocal rank fusion
+
+    Each document contributes at most its share of fetch_k candidates to
+    each retriever, so one large PDF cannot crowd the others out: FAISS is
+    searched once per document, in parallel, with an id filter whose
+    nprobe / efSearch are scaled to the document's share of the index, and
+    the hits are merged by distance into one global ranking. documents,
+    when given, restricts the search to those digests.
+    """
+    import numpy as np
+    from index_factory import search_parameters
+    
+    positions, chunk_documents = get_document_positions(vector_store)
+    selected = list(positions) if documents is None else [digest for digest in documents if digest in positions]
+    if not selected:
+        return []
+    per_document_k = min(fetch_k, max(RETRIEVAL_MIN_PER_DOCUMENT, -(-fetch_k // len(selected))))
+    query = np.asarray([question_vector], dtype=np.float32)
+    
+    def search_document(digest):
+        # A single-document index needs no filter
+        params = search_parameters(vector_store.index, positions[digest]) if len(positions) > 1 else None
+        distances, found = vector_store.index.search(query, min(per_document_k, len(positions[digest])), params=params)
+        return [(float(distance), int(i)) for distance, i in zip(distances[0], found[0]) if i >= 0]
+    
+    if len(selected) == 1:
+        candidates = search_document(selected[0])
+    else:
+        candidates = [hit for hits in _search_executor.map(search_document, selected) for hit in hits]
+    dense_ids = [vector_store.index_to_docstore_id[i] for _, i in sorted(candidates)[:fetch_k]]
+    
+    sparse_index = load_sparse_index(namespace)
+    rankings = [dense_ids]
+    if sparse_index is not None:
+        allowed = set(selected)
+        matches = sparse_index.search(question, None, allowed=lambda chunk_id: chunk_documents.get(chunk_id) in allowed)
+        rankings.append(_take_per_document((chunk_id for chunk_id, _ in matches), chunk_documents, per_document_k, fetch_k))
+    
+    return [vector_store.docstore.search(chunk_id) for chunk_id in reciprocal_rank_fusion(rankings)[:k]]
+
+def sample_diverse_chunks(vector_store, n_chunks, seed=None):
+    """Pick up to n_chunks documents spread across the whole index
+
+    A random sample of at most QUIZ_SAMPLE_PER_CHUNK * n_chunks chunk
+    embeddings is clustered with k-means and the chunk closest to each
+    centroid is looked up in the index itself, so every region of the corpus
+    is represented without copying the whole index.
+    """
+    import faiss
+    import numpy as np
+    
+    index = vector_store.index
+    total = index.ntotal
+    if total == 0:
+        return []
+    if total <= n_chunks:
+        positions = list(range(total))
+    else:
+        seed = random.randrange(2 ** 31) if seed is None else seed
+        rng = np.random.default_rng(seed)
+        sample = np.sort(rng.choice(total, min(total, QUIZ_SAMPLE_PER_CHUNK * n_chunks), replace=False))
+        vectors = np.ascontiguousarray(index.reconstruct_batch(sample), dtype=np.float32)
+        kmeans = faiss.Kmeans(vectors.shape[1], n_chunks, niter=20, seed=seed)
+        kmeans.train(vectors)
+        # Nearest chunk to each centroid not already taken by another centroid
+        _, nearest = index.search(kmeans.centroids, min(total, n_chunks))
+        positions = []
+        for row in nearest:
+            position = next((int(i) for i in row if i >= 0 and int(i) not in positions), None)
+            if position is not None:
+                positions.append(position)
+    return [vector_store.docstore.search(vector_store.index_to_docstore_id[i]) for i in positions]
+
+@st.cache_resource(show_spinner=False)
+def get_answer_cache():
+    """Return the semantic answer cache shared across sessions"""
+    from answer_cache import answer_cache_from_env
+    return answer_cache_from_env()
+
+@st.cache_resource(show_spinner=False)
+def get_api_client():
+    """Return a client for the serving API when ASSISTANT_API_URL is set, else None (work in-process)"""
+    base_url = os.getenv("ASSISTANT_API_URL")
+    if not base_url:
+        return None
+    from api_client import AssistantClient
+    return AssistantClient(base_url)
+
+def get_namespace():
+    """Index namespace (user / corpus) of the current session"""
+    try:
+        return validate_namespace(st.session_state.get("namespace") or DEFAULT_NAMESPACE)
+    except ValueError:
+        return DEFAULT_NAMESPACE
+
+def switch_namespace():
+    """Reset the session's chat and quiz for the newly selected namespace"""
+    st.session_state.chat_history = []
+    st.session_state.quiz_questions = []
+    st.session_state.quiz_answers = []
+    st.session_state.user_answers = []
+    st.session_state.pop("chat_documents", None)
+    st.session_state.pop("conversation", None)
+    update_index_stats()
+
+def get_conversation():
+    """The session's conversation memory, used to rewrite follow-up questions"""
+    from conversation import Conversation, conversation_from_env
+    
+    if "conversation" not in st.session_state:
+        st.session_state.conversation = Conversation(**conversation_from_env())
+    return st.session_state.conversation
+
+def get_index_summary(namespace=DEFAULT_NAMESPACE):
+    """Return a namespace's indexed documents and embedding provider, from the serving API when one is configured"""
+    client = get_api_client()
+    if client is not None:
+        return client.documents(namespace)
+    return {"documents": load_index_manifest(namespace)["documents"], "embedding_provider": get_embedding_provider(namespace)}
+
+def get_answer_cache_stats():
+    """Return the answer cache hit/miss counters, from the serving API when one is configured"""
+    client = get_api_client()
+    if client is not None:
+        return client.stats()["answer_cache"]
+    return get_answer_cache().stats()
+
+def get_stage_stats():
+    """Per-stage latency, counts and cache hits from the tracing spans
+
+    With a serving API the server's stages are shown, overlaid with this
+    process's own (remote calls and rendering).
+    """
+    client = get_api_client()
+    if client is not None:
+        return {**client.stats()["stages"], **telemetry.snapshot()}
+    return telemetry.snapshot()
+
+def show_stats_panel():
+    """Show a table of stage timings and a download of the Prometheus metrics"""
+    st.markdown("### 📈 Live Stats")
+    stages = get_stage_stats()
+    if not stages:
+        st.caption("No questions, quizzes or uploads have been traced yet.")
+        return
+    st.dataframe([
+        {
+            "Stage": name,
+            "Count": stage["count"],
+            "p50 ms": stage["p50_ms"],
+            "p95 ms": stage["p95_ms"],
+            "Last ms": stage["last_ms"],
+            "Cache hits": f"{stage['cache_hit_rate']:.0%}" if stage["cache_hit_rate"] is not None else "",
+        }
+        for name, stage in stages.items()
+    ], use_container_width=True)
+    client = get_api_client()
+    st.download_button(
+        "⬇️ Prometheus metrics",
+        client.metrics() if client is not None else telemetry.render_prometheus(),
+        file_name="metrics.txt",
+        mime="text/plain"
+    )
+
+def update_index_stats():
+    """Refresh the document and chunk counters from the index manifest"""
+    documents = get_index_summary(get_namespace())["documents"]
+    st.session_state.processed_files = len(documents)
+    st.session_state.total_chunks = sum(document["count"] for document in documents.values())
+
+def get_qa_prompt():
+    """Prompt used to answer questions from the retrieved context"""
+    from langchain.prompts import PromptTemplate
+    
     prompt_template = """
     Answer the question as detailed as possible from the provided context, make sure to provide all the details, if the answer is not in
     provided context just say, "answer is not available in the context", don't provide the wrong answer\n\n
@@ -61,58 +623,280 @@ def get_conversational_chain(api_key):
 
     Answer:
     """
+    return PromptTemplate(template=prompt_template, input_variables=["context", "question"])
 
-    model = ChatGoogleGenerativeAI(
+@st.cache_resource(show_spinner=False)
+def get_chat_model(api_key):
+    """Create the Gemini chat model used for answers (shared per process)"""
+    from langchain_google_genai import ChatGoogleGenerativeAI
+    
+    return ChatGoogleGenerativeAI(
         model="models/gemini-1.5-flash",
         temperature=0.3,
         google_api_key=api_key
     )
 
-    prompt = PromptTemplate(template=prompt_template, input_variables=["context", "question"])
-    chain = load_qa_chain(model, chain_type="stuff", prompt=prompt)
+@st.cache_resource(show_spinner=False)
+def get_conversational_chain(api_key):
+    """Create a conversational chain for question answering (shared per process)"""
+    from langchain.chains.question_answering import load_qa_chain
+    
+    chain = load_qa_chain(get_chat_model(api_key), chain_type="stuff", prompt=get_qa_prompt())
 
     return chain
 
+def stream_answer(docs, question, api_key):
+    """Yield answer text as the model produces it, using the same prompt as the "stuff" chain"""
+    context = "\n\n".join(doc.page_content for doc in docs)
+    prompt = get_qa_prompt().format(context=context, question=question)
+    # Only time spent waiting on the model counts, not the caller's work between tokens
+    llm_seconds, answer_tokens, error = 0.0, 0, False
+    resumed = time.perf_counter()
+    try:
+        for chunk in get_chat_model(api_key).stream(prompt):
+            llm_seconds += time.perf_counter() - resumed
+            if chunk.content:
+                answer_tokens += count_tokens(chunk.content)
+                yield chunk.content
+            resumed = time.perf_counter()
+        llm_seconds += time.perf_counter() - resumed
+    except Exception:
+        error = True
+        raise
+    finally:
+        telemetry.record(
+            "ask.llm", llm_seconds, error, streamed=True, prompt_tokens=count_tokens(prompt), answer_tokens=answer_tokens
+        )
+
+def spool_uploads(pdf_docs):
+    """Copy uploads into the content-addressed store and return [{"digest", "name"}] without duplicates"""
+    files = {}
+    for pdf in pdf_docs:
+        digest = store_upload(pdf)
+        files.setdefault(digest, {"digest": digest, "name": getattr(pdf, "name", None) or digest[:12]})
+    return list(files.values())
+
+def ingest_documents(files, api_key, on_progress=None, namespace=DEFAULT_NAMESPACE):
+    """Extract, chunk, embed and index stored PDFs into a namespace without any Streamlit UI
+
+    files is a list of {"digest", "name"} from spool_uploads. Files that are
+    already indexed are skipped and cached parsing / embedding results are
+    reused. on_progress(stage, done, total) is called as "parsing" advances
+    over pages, "embedding" over chunks, and once when "indexing" starts; an
+    exception raised from it stops the ingest. Returns {"added": [digest],
+    "added_chunks": int}.
+    """
+    from embedding import clear_checkpoint, embed_texts
+    
+    report = on_progress or (lambda stage, done, total: None)
+    
+    # Look every file up in the ingestion cache, skipping files that are already in the index
+    with telemetry.span("ingest.lookup", documents=len(files)) as span:
+        provider = get_embedding_provider(namespace)
+        indexed = load_index_manifest(namespace)["documents"]
+        documents = {}
+        uncached = []
+        to_embed = []
+        for file in files:
+            digest, name = file["digest"], file["name"]
+            if digest in indexed:
+                continue
+            documents[digest] = load_cached_document(digest, provider)
+            if documents[digest] is not None:
+                continue
+            cached_chunks = load_cached_chunks(digest)
+            if cached_chunks is not None:
+                # Already chunked, only missing vectors for this provider
+                to_embed.append((digest, name, cached_chunks["chunks"], cached_chunks["pages"]))
+            else:
+                uncached.append((digest, name))
+        span.set(cached_documents=sum(entry is not None for entry in documents.values()), cached_chunkings=len(to_embed))
+    
+    if uncached:
+        # Extract text from PDFs that have not been seen before
+        report("parsing", 0, 0)
+        with telemetry.span("ingest.parse", documents=len(uncached)) as span:
+            # Stored files are named by their hash, which groups pages back per document
+            page_texts = {digest: [] for digest, _ in uncached}
+            for file, _, text in iter_pdf_pages(
+                [pdf_path(digest) for digest, _ in uncached],
+                on_progress=lambda pages_done, total_pages, _: report("parsing", pages_done, total_pages)
+            ):
+                page_texts[os.path.splitext(file)[0]].append(text)
+            span.set(pages=sum(len(texts) for texts in page_texts.values()))
+        
+        with telemetry.span("ingest.chunk", documents=len(uncached)) as span:
+            for digest, name in uncached:
+                chunks = chunk_pages(enumerate(page_texts[digest], start=1))
+                to_embed.append((digest, name, [chunk["text"] for chunk in chunks], [chunk["page"] for chunk in chunks]))
+            span.set(chunks=sum(len(chunks) for _, _, chunks, _ in to_embed))
+    
+    # Embed only the new documents, then cache the results
+    embeddings = get_embeddings(api_key, provider)
+    total_chunks = sum(len(chunks) for _, _, chunks, _ in to_embed)
+    embedded = 0
+    if to_embed:
+        report("embedding", 0, total_chunks)
+    with telemetry.span("ingest.embed", documents=len(to_embed), chunks=total_chunks):
+        for digest, name, chunks, pages in to_embed:
+            checkpoint_key = f"{digest}.{provider}"
+            vectors = embed_texts(
+                chunks, embeddings, checkpoint_key=checkpoint_key,
+                on_progress=lambda done, _: report("embedding", embedded + done, total_chunks)
+            )
+            embedded += len(chunks)
+            documents[digest] = save_cached_document(digest, name, chunks, pages, vectors, provider)
+            clear_checkpoint(checkpoint_key)
+    
+    # Add the new documents' chunks to the vector store
+    report("indexing", 0, 1)
+    with telemetry.span("ingest.index", documents=len(documents)) as span:
+        added_chunks = add_documents_to_index(documents, api_key, provider, namespace)
+        span.set(chunks=added_chunks)
+    
+    # Pre-generate quiz questions for the new documents in the background
+    from quiz_bank import schedule_bank_fill
+    for digest in documents:
+        schedule_bank_fill(digest, api_key)
+    
+    return {"added": list(documents), "added_chunks": added_chunks}
+
 def process_documents(pdf_docs):
-    """Process PDF documents to create vector store"""
+    """Queue uploaded PDFs for background ingestion"""
     if not pdf_docs:
         st.warning("Please upload PDF documents first.")
         return
     
-    with st.spinner("Processing documents..."):
-        # Get API key
-        api_key = os.getenv("GOOGLE_API_KEY")
-        
-        # Extract text from PDFs
-        raw_text = get_pdf_text(pdf_docs)
-        
-        # Create text chunks
-        text_chunks = get_text_chunks(raw_text)
-        st.session_state.total_chunks = len(text_chunks)
-        
-        # Create vector store
-        get_vector_store(text_chunks, api_key)
-        
-        st.session_state.processed_files = len(pdf_docs)
-        
-    st.success(f"✅ Successfully processed {len(pdf_docs)} documents with {len(text_chunks)} text chunks!")
+    with st.spinner("Uploading documents..."), telemetry.span("ingest.upload", documents=len(pdf_docs)):
+        client = get_api_client()
+        if client is not None:
+            job = client.ingest(pdf_docs, get_namespace())
+        else:
+            from ingest_jobs import submit_job
+            job = submit_job(spool_uploads(pdf_docs), os.getenv("GOOGLE_API_KEY"), get_namespace())
+    st.session_state.setdefault("ingest_jobs", []).append(job["id"])
+    st.success(f"✅ Queued {len(job['files'])} document(s) for processing.")
+
+def _format_seconds(seconds):
+    minutes, seconds = divmod(int(seconds), 60)
+    return f"{minutes}m {seconds:02d}s" if minutes else f"{seconds}s"
+
+def _render_job(job, container):
+    names = ", ".join(file["name"] for file in job["files"])
+    progress = job.get("progress") or {}
+    if job["status"] == "done":
+        container.success(f"✅ {names}: {job['added_chunks']} new text chunks indexed")
+    elif job["status"] == "failed":
+        container.error(f"❌ {names}: {job['error']}")
+    elif job["status"] == "cancelled":
+        container.warning(f"⏹️ {names}: cancelled")
+    elif job["status"] == "queued":
+        container.info(f"⏳ {names}: queued")
+    else:
+        text = f"{job['status'].capitalize()} {names}"
+        fraction = 0.0
+        if progress.get("total"):
+            fraction = min(progress["done"] / progress["total"], 1.0)
+            text += f" · {progress['done']}/{progress['total']} {progress['unit']}"
+        if progress.get("rate"):
+            text += f" · {progress['rate']:.1f} {progress['unit']}/s"
+        if progress.get("eta_seconds") is not None:
+            text += f" · ETA {_format_seconds(progress['eta_seconds'])}"
+        container.progress(fraction, text=text)
+
+def show_ingest_jobs(container):
+    """Show this session's ingestion jobs in container, refreshing until they finish
+
+    Call this last in the script: it polls while jobs are running, and any
+    widget interaction reruns the script, which ends the loop.
+    """
+    from ingest_jobs import FINISHED_STATUSES, cancel_job, list_jobs, load_job, resume_jobs
+    client = get_api_client()
+    get_job = client.job if client is not None else load_job
+    if client is None:
+        # Pick up jobs interrupted by a restart of this process
+        resume_jobs(os.getenv("GOOGLE_API_KEY"))
+    
+    # This session's jobs, plus any still running (e.g. submitted before a page refresh)
+    namespace = get_namespace()
+    jobs = client.jobs(namespace) if client is not None else list_jobs(namespace)
+    running = [job["id"] for job in jobs if job["status"] not in FINISHED_STATUSES]
+    job_ids = list(dict.fromkeys(st.session_state.get("ingest_jobs", []) + running))
+    if not job_ids:
+        return
+    
+    panels = {}
+    with container:
+        st.markdown("### ⚙️ Processing")
+        for job_id in job_ids:
+            job = get_job(job_id)
+            if job is None:
+                continue
+            col1, col2 = st.columns([4, 1])
+            if job["status"] not in FINISHED_STATUSES and col2.button("⏹", key=f"cancel_{job_id}", help="Cancel processing"):
+                job = client.cancel_job(job_id) if client is not None else cancel_job(job_id)
+            panels[job_id] = (job, col1.empty())
+    
+    active = True
+    while active:
+        active = False
+        for job_id, (job, placeholder) in panels.items():
+            job = get_job(job_id) or job
+            panels[job_id] = (job, placeholder)
+            _render_job(job, placeholder)
+            active = active or job["status"] not in FINISHED_STATUSES
+        if active:
+            time.sleep(1)
+    
+    # Refresh the document list and counters once per newly finished job
+    seen = st.session_state.setdefault("ingest_jobs_seen", set())
+    finished = [job for job, _ in panels.values() if job["status"] == "done" and job["id"] not in seen]
+    if finished:
+        seen.update(job["id"] for job in finished)
+        update_index_stats()
+        st.rerun()
+
+def clear_index(namespace=DEFAULT_NAMESPACE):
+    """Delete a namespace's whole index (cached ingestion results are kept)"""
+    with _index_lock, writer_lock(namespace):
+        remove_namespace(namespace)
 
-def clear_data():
-    """Clear all data and reset session state"""
-    if os.path.exists("faiss_index"):
-        import shutil
+def clear_data(digest=None):
+    """Clear the session's namespace and reset session state, or remove a single document"""
+    client = get_api_client()
+    namespace = get_namespace()
+    if digest is not None:
         try:
-            shutil.rmtree("faiss_index")
+            if client is not None:
+                client.remove_document(digest, namespace)
+            else:
+                remove_document_from_index(digest, os.getenv("GOOGLE_API_KEY"), namespace)
         except Exception as e:
-            st.error(f"Error clearing data: {str(e)}")
+            st.error(f"Error removing document: {str(e)}")
+        update_index_stats()
+        st.rerun()
+        return
+
+    try:
+        if client is not None:
+            client.clear(namespace)
+        else:
+            clear_index(namespace)
+    except Exception as e:
+        st.error(f"Error clearing data: {str(e)}")
     
     # Reset session state
     st.session_state.processed_files = 0
     st.session_state.total_chunks = 0
     st.session_state.chat_history = []
+    st.session_state.pop("conversation", None)
+    st.session_state.pop("last_question", None)
+    # The serving API keeps conversations per session id, so start a new one
+    st.session_state.session_id = uuid.uuid4().hex
+    st.session_state.ingest_jobs = []
     st.session_state.quiz_questions = []
     st.session_state.quiz_answers = []
     st.session_state.user_answers = []
     
     st.success("✅ All data has been cleared.")
-    st.experimental_rerun()
\ No newline at end of file
+    st.rerun()
\ No newline at end of file